@@ -0,0 +1,183 @@
+import logging
+import threading
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Batch sizes the sizer moves between
+BATCH_SIZES = (5, 8, 10, 12, 15, 20, 25, 30, 40)
+# Exponential moving average weight of the newest batch
+SMOOTHING = 0.3
+# Parse success below this means responses are being cut off: shrink at once
+TRUNCATION_PARSE_RATE = 0.8
+# Headroom kept on top of the expected response length
+OUTPUT_SAFETY = 1.2
+
+
+def _ewma(previous: Optional[float], value: float) -> float:
+    return value if previous is None else previous + SMOOTHING * (value - previous)
+
+
+class SizeStats:
+    """Smoothed outcome of the batches run at one size"""
+
+    def __init__(self):
+        self.batches = 0
+        self.accepted: Optional[float] = None
+        self.seconds: Optional[float] = None
+        self.tokens: Optional[float] = None
+
+    def record(self, accepted: int, seconds: float, tokens: int) -> None:
+        self.batches += 1
+        self.accepted = _ewma(self.accepted, accepted)
+        self.seconds = _ewma(self.seconds, seconds)
+        self.tokens = _ewma(self.tokens, tokens)
+
+    @property
+    def per_second(self) -> float:
+        return self.accepted / self.seconds if self.seconds else 0.0
+
+    @property
+    def per_token(self) -> float:
+        return self.accepted / self.tokens if self.tokens else 0.0
+
+    @property
+    def score(self) -> float:
+        # Product of both efficiencies: a size only wins if it is not much worse on either
+        return self.per_second * self.per_token
+
+
+class CategorySizing:
+    """Observed response sizes and batch outcomes of one category"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.by_size: Dict[int, SizeStats] = {}
+        self.prompt_tokens: Optional[float] = None
+        self.tokens_per_question: Optional[float] = None
+        self.parse_rate: Optional[float] = None
+        self.batches = 0
+        self.changes = 0
+        self.reason = "initial"
+        self.probe_up = True
+
+
+class BatchSizer:
+    """Per-category batch size that adapts to observed throughput and token cost.
+
+    After every batch the sizer updates, per category, the smoothed response
+    tokens per question, the parse success rate and, for each batch size
+    tried, accepted questions per second and per token. The next size is the
+    best scoring one that fits `token_budget` (prompt plus expected response
+    tokens per LLM call). Every `probe_every` batches a neighbouring size is
+    tried so the choice keeps tracking the model, and batches that come back
+    truncated shrink the size immediately.
+    """
+
+    def __init__(self, initial_size: int = 15, min_size: int = 5, max_size: int = 40,
+                 token_budget: int = 8192, probe_every: int = 4):
+        self.sizes = [size for size in BATCH_SIZES if min_size <= size <= max_size] or [initial_size]
+        self.initial_size = min(self.sizes, key=lambda size: abs(size - initial_size))
+        self.token_budget = token_budget
+        self.probe_every = max(2, probe_every)
+        self.categories: Dict[str, CategorySizing] = {}
+        self._lock = threading.Lock()
+
+    def _category(self, category: str) -> CategorySizing:
+        sizing = self.categories.get(category)
+        if sizing is None:
+            sizing = self.categories[category] = CategorySizing(self.initial_size)
+        return sizing
+
+    def _budget_limit(self, sizing: CategorySizing) -> int:
+        """Largest batch whose prompt and expected response fit the token budget"""
+        if sizing.tokens_per_question is None or sizing.prompt_tokens is None:
+            return self.sizes[-1]
+        fitting = [size for size in self.sizes
+                   if sizing.prompt_tokens + size * sizing.tokens_per_question * OUTPUT_SAFETY <= self.token_budget]
+        return fitting[-1] if fitting else self.sizes[0]
+
+    def size(self, category: str) -> int:
+        with self._lock:
+            return self._category(category).size
+
+    def record(self, category: str, requested: int, accepted: int, seconds: float,
+               prompt_tokens: Optional[int] = None, response_tokens: Optional[int] = None,
+               parsed: Optional[int] = None, complete: bool = True) -> int:
+        """Feed back one finished batch and return the size for the next one.
+
+        Token counts and the parsed count come from the generator; without
+        them only throughput drives the choice. A response cut off by a backend
+        error (`complete=False`) says nothing about the batch size and is ignored.
+        """
+        with self._lock:
+            sizing = self._category(category)
+            if not complete:
+                return sizing.size
+            sizing.batches += 1
+            if prompt_tokens is not None:
+                sizing.prompt_tokens = _ewma(sizing.prompt_tokens, prompt_tokens)
+            if parsed:
+                sizing.tokens_per_question = _ewma(sizing.tokens_per_question, (response_tokens or 0) / parsed)
+            if parsed is not None and requested:
+                sizing.parse_rate = _ewma(sizing.parse_rate, min(1.0, parsed / requested))
+            tokens = (prompt_tokens or 0) + (response_tokens or 0)
+            sizing.by_size.setdefault(requested, SizeStats()).record(accepted, seconds, tokens)
+
+            limit = self._budget_limit(sizing)
+            index = self.sizes.index(sizing.size) if sizing.size in self.sizes else 0
+            if sizing.parse_rate is not None and sizing.parse_rate < TRUNCATION_PARSE_RATE and index > 0:
+                size, reason = self.sizes[index - 1], f"truncated ({sizing.parse_rate:.0%} parsed)"
+            elif sizing.size > limit:
+                size, reason = limit, "token budget"
+            elif sizing.batches % self.probe_every == 0:
+                step = 1 if sizing.probe_up else -1
+                sizing.probe_up = not sizing.probe_up
+                neighbour = self.sizes[max(0, min(len(self.sizes) - 1, index + step))]
+                size, reason = min(neighbour, limit), "probe"
+            else:
+                # Short final batches are recorded too, but only planned sizes are chosen from
+                tried = {candidate: stats for candidate, stats in sizing.by_size.items()
+                         if candidate in self.sizes and candidate <= limit}
+                if tried:
+                    size = max(tried, key=lambda candidate: tried[candidate].score)
+                    reason = "best score" if size != sizing.size else sizing.reason
+                else:
+                    size, reason = sizing.size, sizing.reason
+
+            if size != sizing.size:
+                sizing.changes += 1
+                logger.info(f"[{category}] Batch size {sizing.size} -> {size} ({reason})")
+            sizing.size, sizing.reason = size, reason
+            return size
+
+    def summary_table(self) -> str:
+        """One row per category: current size, why it was chosen and what it is based on"""
+        rows = [f"{'category':<28}{'size':>6}{'limit':>7}{'tok/q':>8}{'parse':>7}{'q/s':>8}"
+                f"{'q/1k tok':>10}{'batches':>9}{'changes':>9}  reason"]
+        with self._lock:
+            for category, sizing in sorted(self.categories.items()):
+                stats = sizing.by_size.get(sizing.size)
+                tokens_per_question = f"{sizing.tokens_per_question:.0f}" if sizing.tokens_per_question else "-"
+                parse_rate = f"{sizing.parse_rate:.2f}" if sizing.parse_rate is not None else "-"
+                per_second = f"{stats.per_second:.2f}" if stats else "-"
+                per_kilotoken = f"{stats.per_token * 1000:.2f}" if stats else "-"
+                rows.append(f"{category[:27]:<28}{sizing.size:>6}{self._budget_limit(sizing):>7}"
+                            f"{tokens_per_question:>8}{parse_rate:>7}{per_second:>8}{per_kilotoken:>10}"
+                            f"{sizing.batches:>9}{sizing.changes:>9}  {sizing.reason}")
+        return "\n".join(rows)
+
+    def decisions(self) -> List[Dict]:
+        with self._lock:
+            return [
+                {
+                    "category": category,
+                    "size": sizing.size,
+                    "limit": self._budget_limit(sizing),
+                    "reason": sizing.reason,
+                    "batches": sizing.batches,
+                    "changes": sizing.changes,
+                    "tokens_per_question": sizing.tokens_per_question,
+                    "parse_rate": sizing.parse_rate
+                } for category, sizing in sorted(self.categories.items())
+            ]
@@ -0,0 +1,85 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List
+
+# Modules that must stay importable without a config, a database or an LLM
+# client, and the heavy dependencies they may only load on first use
+MODULES = (
+    "config", "metrics", "response_parser", "context_selection", "dedup", "retry",
+    "llm_backends", "response_cache", "database", "question_generator", "scheduler",
+    "refill_jobs", "batch_sizing", "category_registry", "quiz_service", "work_queue",
+    "repair_questions", "question_bank", "main",
+)
+HEAVY_MODULES = ("sqlalchemy", "langchain", "langchain_google_genai", "dotenv", "google")
+
+_PROBE = """
+import json, sys
+import {module}
+print(json.dumps(sorted({{name.split(".")[0] for name in sys.modules}} & set({heavy!r}))))
+"""
+
+
+def measure_import(module: str) -> Dict:
+    """Import `module` in a fresh interpreter, return its cumulative import time and heavy imports"""
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    env = {key: value for key, value in os.environ.items() if key != "DATABASE_URL"}
+    env["PYTHONPATH"] = src_dir
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        capture_output=True, text=True, cwd=src_dir, env=env
+    )
+    if completed.returncode != 0:
+        return {"module": module, "error": completed.stderr.strip().splitlines()[-1]}
+
+    cumulative_us = 0
+    for line in completed.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module and not parts[2][1:].startswith(" "):
+            cumulative_us = int(parts[1])
+    return {
+        "module": module,
+        "import_ms": round(cumulative_us / 1000, 3),
+        "heavy": json.loads(completed.stdout.strip().splitlines()[-1]),
+        "stdout_lines": len(completed.stdout.strip().splitlines()) - 1,
+    }
+
+
+def check_budget(results: List[Dict], budget_ms: float) -> List[str]:
+    problems = []
+    for result in results:
+        if "error" in result:
+            problems.append(f"{result['module']}: import failed: {result['error']}")
+            continue
+        if result["import_ms"] > budget_ms:
+            problems.append(f"{result['module']}: import took {result['import_ms']}ms > {budget_ms}ms")
+        if result["heavy"]:
+            problems.append(f"{result['module']}: imports {', '.join(result['heavy'])} eagerly")
+        if result["stdout_lines"]:
+            problems.append(f"{result['module']}: prints at import time")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that project modules import fast and without side effects")
+    parser.add_argument("modules", nargs="*", default=list(MODULES))
+    parser.add_argument("--budget-ms", type=float, default=100.0,
+                        help="Maximum cumulative import time per module")
+    args = parser.parse_args()
+
+    results = [measure_import(module) for module in args.modules]
+    for result in results:
+        print(json.dumps(result))
+
+    problems = check_budget(results, args.budget_ms)
+    for problem in problems:
+        print(f"IMPORT BUDGET: {problem}", file=sys.stderr)
+    if problems:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import argparse
+import random
+import time
+
+from response_parser import ResponseParser
+
+DIFFICULTY_SCORES = {"easy": 5, "medium": 10, "hard": 15}
+
+
+def synthetic_block(rng: random.Random, index: int, malformed: bool = False) -> str:
+    """Render one question block in the format requested by the prompt"""
+    difficulty = rng.choice(list(DIFFICULTY_SCORES))
+    answer = f"Правильный ответ номер {index}"
+    lines = [
+        f"QUESTION: Что выведет следующий код на Java (вопрос {index})?",
+        "```java",
+        "List<Integer> list = new ArrayList<>();",
+        "list.add(1);",
+        "System.out.println(list.size());",
+        "```",
+        f"ANSWER: {answer}",
+        f"DIFFICULTY: {difficulty}",
+        f"SCORE: {DIFFICULTY_SCORES[difficulty]}",
+        "OPTIONS:",
+        f"1. {answer}",
+        f"2. Неверный вариант {index}-2",
+        f"3. Неверный вариант {index}-3",
+        f"4. Неверный вариант {index}-4",
+        "===",
+    ]
+    if malformed:
+        # Drop the options section, a common truncation failure
+        lines = lines[:9] + ["==="]
+    return "\n".join(lines)
+
+
+def synthetic_response(num_questions: int, malformed_rate: float = 0.05, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    return "\n\n".join(
+        synthetic_block(rng, i, malformed=rng.random() < malformed_rate) for i in range(num_questions)
+    )
+
+
+def run(num_responses: int, questions_per_response: int, chunk_size: int) -> None:
+    corpus = [synthetic_response(questions_per_response, seed=seed) for seed in range(num_responses)]
+    total_bytes = sum(len(text.encode("utf-8")) for text in corpus)
+
+    start = time.perf_counter()
+    parsed = errors = 0
+    for text in corpus:
+        parser = ResponseParser()
+        if chunk_size:
+            questions = []
+            for offset in range(0, len(text), chunk_size):
+                questions.extend(parser.feed(text[offset:offset + chunk_size]))
+            questions.extend(parser.close())
+        else:
+            questions, _ = parser.parse(text)
+        parsed += len(questions)
+        errors += len(parser.errors)
+    elapsed = time.perf_counter() - start
+
+    mode = f"streamed in {chunk_size}-char chunks" if chunk_size else "whole response"
+    print(f"{num_responses} responses x {questions_per_response} questions ({mode})")
+    print(f"  parsed: {parsed} questions, {errors} parse errors")
+    print(f"  time:   {elapsed:.3f}s, {parsed / elapsed:,.0f} questions/s, "
+          f"{total_bytes / elapsed / 1e6:.1f} MB/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark for the LLM response parser")
+    parser.add_argument("--responses", type=int, default=50)
+    parser.add_argument("--questions", type=int, default=1000,
+                        help="Questions per synthetic response")
+    parser.add_argument("--chunk-size", type=int, default=0,
+                        help="Feed responses in chunks of this many characters (0 = whole response)")
+    args = parser.parse_args()
+    run(args.responses, args.questions, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, Iterator, List
+
+from context_selection import estimate_tokens
+from llm_backends import FakeLLMBackend, LLMBackend
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def summarize(values: List[float]) -> Dict:
+    return {
+        "count": len(values),
+        "total_s": round(sum(values), 6),
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+    }
+
+
+class StageRecorder:
+    """Thread-safe collection of per-stage durations and counters"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.durations: Dict[str, List[float]] = {}
+        self.counters: Dict[str, int] = {}
+
+    def record(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.durations.setdefault(stage, []).append(seconds)
+
+    def count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+
+class InstrumentedBackend(LLMBackend):
+    """Measures time spent inside the wrapped backend, excluding the consumer"""
+
+    def __init__(self, backend: LLMBackend, recorder: StageRecorder):
+        self.backend = backend
+        self.model = backend.model
+        self.temperature = backend.temperature
+        self.recorder = recorder
+        self.local = threading.local()
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        self.recorder.count("prompt_tokens", estimate_tokens(prompt))
+        self.local.llm_seconds = 0.0
+        chunks = iter(self.backend.stream(prompt))
+        received = []
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    break
+                finally:
+                    self.local.llm_seconds += time.perf_counter() - start
+                received.append(chunk)
+                yield chunk
+        finally:
+            # Counted on the whole response: a separator can be split across chunks
+            self.recorder.count("blocks", "".join(received).count("==="))
+            self.recorder.record("llm", self.local.llm_seconds)
+
+
+class InstrumentedGenerator:
+    """Splits each generate_questions call into LLM time and parse time"""
+
+    def __init__(self, generator, backend: InstrumentedBackend, recorder: StageRecorder):
+        self.generator = generator
+        self.backend = backend
+        self.recorder = recorder
+
+    def generate_questions(self, existing_questions, num_questions=5, total_questions=None):
+        start = time.perf_counter()
+        try:
+            questions = self.generator.generate_questions(existing_questions, num_questions, total_questions)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.recorder.record("generate_questions", elapsed)
+            self.recorder.record("parse", max(0.0, elapsed - getattr(self.backend.local, "llm_seconds", 0.0)))
+        self.recorder.count("parsed", len(questions))
+        return questions
+
+
+class InstrumentedDatabase:
+    """Proxy that times the insert path of a Database"""
+
+    def __init__(self, db, recorder: StageRecorder):
+        self.db = db
+        self.recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+    def insert_questions(self, questions, category_id, on_insert=None):
+        start = time.perf_counter()
+        try:
+            return self.db.insert_questions(questions, category_id, on_insert=on_insert)
+        finally:
+            self.recorder.record("insert_questions", time.perf_counter() - start)
+
+
+def prepare_database(database_url: str, num_categories: int):
+    from database import Database
+    from schema import create_sqlite_schema
+    from sqlalchemy import text
+
+    db = Database(database_url)
+    if db.engine.dialect.name == "sqlite":
+        create_sqlite_schema(db.engine)
+    with db.engine.begin() as connection:
+        for i in range(num_categories):
+            slug = f"bench-{i}"
+            exists = connection.execute(text("SELECT 1 FROM categories WHERE slug = :slug"), {"slug": slug}).first()
+            if not exists:
+                connection.execute(
+                    text("INSERT INTO categories (name, name_ru, slug) VALUES (:name, :name_ru, :slug)"),
+                    {"name": f"Bench {i}", "name_ru": f"Бенч {i}", "slug": slug}
+                )
+        categories = connection.execute(
+            text("SELECT id, name, name_ru, slug FROM categories WHERE slug LIKE 'bench-%' ORDER BY id")
+        ).fetchall()
+    return db, [{"id": row[0], "name": row[1], "name_ru": row[2], "slug": row[3]} for row in categories]
+
+
+def run_benchmark(args) -> Dict:
+    from question_generator import QuestionGenerator
+    from retry import CircuitBreaker, RetryPolicy
+    from scheduler import GenerationScheduler
+
+    recorder = StageRecorder()
+    backend = InstrumentedBackend(
+        FakeLLMBackend(
+            latency=args.latency,
+            jitter=args.jitter,
+            error_rate=args.error_rate,
+            malformed_rate=args.malformed_rate,
+            seed=args.seed,
+        ),
+        recorder
+    )
+    db, categories = prepare_database(args.database_url, args.categories)
+
+    def generator_factory(category_name, category_name_ru):
+        return InstrumentedGenerator(
+            QuestionGenerator(category_name, category_name_ru, backend=backend), backend, recorder
+        )
+
+    scheduler = GenerationScheduler(
+        InstrumentedDatabase(db, recorder),
+        max_workers=args.max_workers,
+        per_category=args.per_category,
+        requests_per_second=0,
+        batch_size=args.batch_size,
+        retry_policy=RetryPolicy(base_delay=0.01, rate_limit_base_delay=0.05, max_delay=0.5),
+        circuit_breaker=CircuitBreaker(reset_timeout=0.5),
+        generator_factory=generator_factory,
+    )
+
+    start = time.perf_counter()
+    results = scheduler.run(categories, num_questions=args.questions)
+    wall = time.perf_counter() - start
+
+    accepted = sum(results.values())
+    blocks = recorder.counters.get("blocks", 0)
+    parsed = recorder.counters.get("parsed", 0)
+    return {
+        "config": {key: value for key, value in vars(args).items() if key not in ("baseline", "output")},
+        "wall_s": round(wall, 6),
+        "accepted": accepted,
+        "questions_per_s": round(accepted / wall, 3) if wall else 0.0,
+        "batch_latency": summarize(recorder.durations.get("generate_questions", [])),
+        "prompt_tokens_per_accepted": round(recorder.counters.get("prompt_tokens", 0) / accepted, 3) if accepted else None,
+        "parse_failure_rate": round(1 - parsed / blocks, 6) if blocks else 0.0,
+        "stages": {
+            stage: summarize(recorder.durations.get(stage, []))
+            for stage in ("generate_questions", "llm", "parse", "insert_questions")
+        },
+    }
+
+
+def check_regression(result: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Compare against a previous result file, return human-readable regressions"""
+    problems = []
+    if result["questions_per_s"] < baseline["questions_per_s"] * (1 - tolerance):
+        problems.append(f"questions_per_s {result['questions_per_s']} < baseline {baseline['questions_per_s']}")
+    for stage, stats in result["stages"].items():
+        base = baseline.get("stages", {}).get(stage)
+        if base and base["p95_ms"] and stats["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            problems.append(f"{stage} p95 {stats['p95_ms']}ms > baseline {base['p95_ms']}ms")
+    base_tokens = baseline.get("prompt_tokens_per_accepted")
+    if base_tokens and result["prompt_tokens_per_accepted"] > base_tokens * (1 + tolerance):
+        problems.append(f"prompt_tokens_per_accepted {result['prompt_tokens_per_accepted']} > baseline {base_tokens}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of the question generation pipeline")
+    parser.add_argument("--database-url", default=None,
+                        help="SQLAlchemy URL (default: a temporary SQLite file)")
+    parser.add_argument("--categories", type=int, default=5)
+    parser.add_argument("--questions", type=int, default=300, help="Questions per category")
+    parser.add_argument("--batch-size", type=int, default=15)
+    parser.add_argument("--max-workers", type=int, default=8)
+    parser.add_argument("--per-category", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.0, help="Fake LLM latency per call (s)")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON result to this file")
+    parser.add_argument("--baseline", help="Fail if the result regresses against this JSON result file")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed relative regression against the baseline")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if args.database_url is None:
+            args.database_url = f"sqlite:///{os.path.join(tmpdir, 'bench.db')}"
+        result = run_benchmark(args)
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = check_regression(result, json.load(f), args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION: {problem}", file=sys.stderr)
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    main()
@@ -0,0 +1,47 @@
+import threading
+from typing import Callable, Dict, List, Optional
+
+
+class CategoryRegistry:
+    """In-process copy of the categories table with id and slug indexes.
+
+    Categories change only when they are seeded, so the table is read once and
+    every lookup after that is a dict hit. Call `invalidate()` after writing
+    categories; the next lookup reloads them.
+    """
+
+    def __init__(self, loader: Callable[[], List[Dict]]):
+        self._loader = loader
+        self._lock = threading.Lock()
+        self._categories: Optional[List[Dict]] = None
+        self._by_id: Dict[int, Dict] = {}
+        self._by_slug: Dict[str, Dict] = {}
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._categories = None
+
+    def _load(self) -> List[Dict]:
+        with self._lock:
+            if self._categories is None:
+                categories = self._loader()
+                if not categories:
+                    # Nothing seeded yet or the query failed: do not cache an empty registry
+                    return []
+                self._categories = categories
+                self._by_id = {category["id"]: category for category in categories}
+                self._by_slug = {category["slug"]: category for category in categories}
+            return self._categories
+
+    def all(self) -> List[Dict]:
+        return [dict(category) for category in self._load()]
+
+    def by_id(self, category_id: int) -> Optional[Dict]:
+        self._load()
+        category = self._by_id.get(category_id)
+        return dict(category) if category is not None else None
+
+    def by_slug(self, slug: str) -> Optional[Dict]:
+        self._load()
+        category = self._by_slug.get(slug)
+        return dict(category) if category is not None else None
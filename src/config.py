@@ -1,16 +1,62 @@
-from dotenv import load_dotenv
+import logging
 import os
 
-load_dotenv()
+logger = logging.getLogger(__name__)
 
-# Try getting from .env first
-DATABASE_URL = os.getenv("DATABASE_URL")
+# Settings are read on first access (`from config import X` included), so
+# importing this module has no side effects and needs no .env or database.
+# name -> (default, type)
+_SETTINGS = {
+    "OPENAI_API_KEY": (None, str),
 
-# Print debug info
-print("Environment variables:")
-print(f"DATABASE_URL from .env: {DATABASE_URL}")
-print(f"DATABASE_URL from system: {os.environ.get('DATABASE_URL')}")
+    # Concurrent generation scheduler
+    "GENERATION_MAX_WORKERS": ("8", int),
+    "GENERATION_PER_CATEGORY": ("2", int),
+    "GENERATION_REQUESTS_PER_SECOND": ("1.0", float),
+    # Prompt plus response tokens per LLM call that adaptive batch sizing stays within
+    "GENERATION_TOKEN_BUDGET": ("8192", int),
 
-if not DATABASE_URL:
-    raise ValueError("DATABASE_URL environment variable is not set")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY") 
\ No newline at end of file
+    # Optional on-disk cache of LLM responses
+    "RESPONSE_CACHE_PATH": (None, str),
+
+    # LLM backend used for generation ("google" or "fake")
+    "LLM_BACKEND": ("google", str),
+
+    # Checkpoints of resumable refill jobs (main.py --target)
+    "REFILL_STATE_PATH": ("refill_state.db", str),
+}
+
+_env_loaded = False
+
+
+def load_env() -> None:
+    """Load .env into the process environment once; real environment variables win"""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        _env_loaded = True
+
+
+def get_database_url() -> str:
+    load_env()
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        raise ValueError("DATABASE_URL environment variable is not set")
+    return database_url
+
+
+def get_setting(name: str):
+    default, cast = _SETTINGS[name]
+    load_env()
+    value = os.getenv(name, default)
+    return cast(value) if value is not None else None
+
+
+def __getattr__(name: str):
+    if name == "DATABASE_URL":
+        return get_database_url()
+    if name in _SETTINGS:
+        return get_setting(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
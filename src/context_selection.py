@@ -0,0 +1,120 @@
+import random
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+# Rough chars-per-token ratio for mixed Russian/English text
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate used for prompt budgeting"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    text = " ".join(text.split())
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars - 1].rstrip() + "…"
+
+
+def format_question_line(question: Dict, max_question_chars: int = 160, max_answer_chars: int = 60) -> str:
+    """Format one existing question as a compact prompt line"""
+    return (f"- {_truncate(question['question'], max_question_chars)} "
+            f"(Answer: {_truncate(question['correct_answer'], max_answer_chars)})")
+
+
+def bounded_history(questions: Iterable[Dict], recent: int = 200, sample: int = 300, seed: int = 0) -> List[Dict]:
+    """Reduce a stream of questions (oldest first) to what ContextSelector can use.
+
+    Keeps the `recent` newest questions in order, preceded by a uniform
+    reservoir sample of `sample` older ones, so memory is bounded no matter
+    how large the category is.
+    """
+    rng = random.Random(seed)
+    window: deque = deque()
+    reservoir: List[Dict] = []
+    seen_older = 0
+    for question in questions:
+        window.append(question)
+        if len(window) <= recent:
+            continue
+        older = window.popleft()
+        seen_older += 1
+        if len(reservoir) < sample:
+            reservoir.append(older)
+        else:
+            index = rng.randrange(seen_older)
+            if index < sample:
+                reservoir[index] = older
+    return reservoir + list(window)
+
+
+class ContextSelector:
+    """Selects a bounded digest of existing questions for the generation prompt.
+
+    The digest mixes the most recent questions (what the model produced last,
+    and is most likely to repeat) with a uniform random sample of older ones
+    for topic coverage. Work and output size depend only on the token budget,
+    not on the number of questions in the category. The sample is seeded from
+    the number of questions, so the same input always yields the same digest
+    (and the same rendered prompt for the response cache).
+    """
+
+    def __init__(
+        self,
+        token_budget: int = 1500,
+        recent_share: float = 0.5,
+        max_question_chars: int = 160,
+        max_answer_chars: int = 60,
+        seed: int = 0,
+    ):
+        self.token_budget = token_budget
+        self.recent_share = recent_share
+        self.max_question_chars = max_question_chars
+        self.max_answer_chars = max_answer_chars
+        self.seed = seed
+
+    def _line(self, question: Dict) -> str:
+        return format_question_line(question, self.max_question_chars, self.max_answer_chars)
+
+    def select(self, existing_questions: List[Dict]) -> List[Dict]:
+        """Return the subset of questions that fits into the token budget"""
+        total = len(existing_questions)
+        if not total:
+            return []
+
+        # Upper bound on how many lines can fit, so sampling stays O(budget)
+        max_line_tokens = (self.max_question_chars + self.max_answer_chars + 16) // CHARS_PER_TOKEN
+        capacity = min(total, max(1, self.token_budget // max(1, max_line_tokens // 2)))
+        recent_count = min(total, int(capacity * self.recent_share))
+        recent_indices = list(range(total - 1, total - 1 - recent_count, -1))
+
+        older = total - recent_count
+        sample_count = min(older, capacity - recent_count)
+        rng = random.Random(f"{self.seed}:{total}")
+        sampled_indices = rng.sample(range(older), sample_count) if sample_count else []
+
+        selected = []
+        used_tokens = 0
+        for index in recent_indices + sampled_indices:
+            tokens = estimate_tokens(self._line(existing_questions[index]))
+            if used_tokens + tokens > self.token_budget:
+                break
+            used_tokens += tokens
+            selected.append(existing_questions[index])
+        return selected
+
+    def build_digest(self, existing_questions: List[Dict], total_questions: Optional[int] = None) -> str:
+        """Render the selected questions as the `{existing_questions}` prompt block.
+
+        `total_questions` is the category's real size when `existing_questions`
+        is only a bounded history of it, so the "and N more" note stays true.
+        """
+        selected = self.select(existing_questions)
+        lines = [self._line(question) for question in selected]
+        total = max(total_questions or 0, len(existing_questions))
+        omitted = total - len(selected)
+        if omitted > 0:
+            lines.append(f"(and {omitted} more existing questions on this topic — do not repeat them)")
+        return "\n".join(lines)
@@ -1,23 +1,85 @@
-from sqlalchemy import create_engine, text
-from config import DATABASE_URL
+from category_registry import CategoryRegistry
+from metrics import metrics
+import json
 import logging
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Iterator, Optional, Sequence, Tuple
 
 logger = logging.getLogger(__name__)
 
+QUESTION_COLUMNS = ("id", "question", "correct_answer", "options", "difficulty", "score")
+DEFAULT_QUESTION_COLUMNS = ("question", "correct_answer", "options", "difficulty", "score")
+# What the generator actually needs for prompt context and duplicate checks
+GENERATOR_QUESTION_COLUMNS = ("question", "correct_answer")
+# Columns of user_category_stats a leaderboard can be ranked by
+LEADERBOARD_ORDERS = ("total_score", "best_score")
+
+
+def text(statement: str):
+    """sqlalchemy.text, imported on first use so that importing this module stays cheap"""
+    from sqlalchemy import text as sql_text
+
+    return sql_text(statement)
+
+
+def _emit_sqlite_begin(engine) -> None:
+    """Let SQLAlchemy issue BEGIN itself on SQLite.
+
+    pysqlite defers BEGIN until the first DML statement, so a SAVEPOINT can
+    end up as the outermost transaction and its RELEASE commits on the spot.
+    This is SQLAlchemy's documented workaround; it makes SAVEPOINTs and
+    rollbacks behave as on Postgres.
+    """
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "connect")
+    def disable_pysqlite_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def begin(connection):
+        connection.exec_driver_sql("BEGIN")
+
+
 class Database:
-    def __init__(self):
-        logger.info(f"Connecting to database with URL: {DATABASE_URL}")
-        self.engine = create_engine(
-            DATABASE_URL,
-            pool_size=5,
-            max_overflow=10,
-            pool_timeout=30,
-            pool_recycle=1800
-        )
+    def __init__(self, database_url: Optional[str] = None):
+        from sqlalchemy import create_engine
+
+        if database_url is None:
+            from config import get_database_url
+            database_url = get_database_url()
+        logger.info(f"Connecting to database with URL: {database_url}")
+        if database_url.startswith("sqlite"):
+            # SQLite (benchmarks, tests) has no server-side pool to tune
+            self.engine = create_engine(database_url)
+            _emit_sqlite_begin(self.engine)
+        else:
+            self.engine = create_engine(
+                database_url,
+                pool_size=5,
+                max_overflow=10,
+                pool_timeout=30,
+                pool_recycle=1800
+            )
+        # SQLite has no array type, options are stored as a JSON string there
+        self.json_options = self.engine.dialect.name == "sqlite"
+        self.categories = CategoryRegistry(self._load_categories)
+        # Called with the category id after its questions change (None: any category), e.g. to drop caches
+        self.write_listeners: List[Callable[[Optional[int]], None]] = []
+
+    def _notify_write(self, category_id: Optional[int]) -> None:
+        for listener in self.write_listeners:
+            try:
+                listener(category_id)
+            except Exception as e:
+                logger.error(f"Error in write listener for category {category_id}: {e}")
     
-    def get_categories(self) -> List[Dict]:
-        """Get all categories from the database"""
+    def _encode_options(self, options: List[str]):
+        return json.dumps(options, ensure_ascii=False) if self.json_options else options
+    
+    def _decode_options(self, options) -> List[str]:
+        return json.loads(options) if isinstance(options, str) else options
+    
+    def _load_categories(self) -> List[Dict]:
         try:
             with self.engine.connect() as connection:
                 result = connection.execute(text("SELECT id, name, name_ru, slug FROM categories"))
@@ -33,35 +95,117 @@ class Database:
             logger.error(f"Error getting categories: {e}")
             return []
 
-    def get_existing_questions(self, category_id: int) -> List[Dict]:
-        """Get existing questions for a specific category"""
+    def get_categories(self) -> List[Dict]:
+        """Get all categories (cached in-process, see invalidate_categories)"""
+        return self.categories.all()
+
+    def get_category(self, category_id: int) -> Optional[Dict]:
+        """Get a category by its id"""
+        return self.categories.by_id(category_id)
+
+    def invalidate_categories(self) -> None:
+        """Drop the cached categories after they were changed"""
+        self.categories.invalidate()
+
+    def _question_columns(self, columns: Optional[Sequence[str]]) -> Tuple[str, ...]:
+        columns = tuple(columns or DEFAULT_QUESTION_COLUMNS)
+        unknown = set(columns) - set(QUESTION_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown quiz_questions columns: {sorted(unknown)}")
+        return columns
+
+    def _question_row(self, columns: Tuple[str, ...], row) -> Dict:
+        question = dict(zip(columns, row))
+        if "options" in question:
+            question["options"] = self._decode_options(question["options"])
+        return question
+
+    def get_existing_questions(self, category_id: int, columns: Optional[Sequence[str]] = None) -> List[Dict]:
+        """Get existing questions for a specific category, optionally only the given columns"""
+        columns = self._question_columns(columns)
         try:
             with self.engine.connect() as connection:
                 result = connection.execute(
-                    text("""
-                        SELECT question, correct_answer, options, difficulty, score 
+                    text(f"""
+                        SELECT {", ".join(columns)} 
                         FROM quiz_questions 
                         WHERE category_id = :category_id
                     """),
                     {"category_id": category_id}
                 )
-                return [
-                    {
-                        "question": row[0],
-                        "correct_answer": row[1],
-                        "options": row[2],
-                        "difficulty": row[3],
-                        "score": row[4]
-                    } for row in result
-                ]
+                return [self._question_row(columns, row) for row in result]
         except Exception as e:
             logger.error(f"Error getting questions for category {category_id}: {e}")
             return []
 
+    def iter_questions(self, category_id: int, columns: Optional[Sequence[str]] = None,
+                       batch_size: int = 1000) -> Iterator[Dict]:
+        """Stream a category's questions in id order through a server-side cursor.
+
+        Only `batch_size` rows are buffered at a time, so memory stays flat
+        regardless of the category size.
+        """
+        columns = self._question_columns(columns)
+        try:
+            with self.engine.connect() as connection:
+                result = connection.execution_options(yield_per=batch_size).execute(
+                    text(f"""
+                        SELECT {", ".join(columns)} 
+                        FROM quiz_questions 
+                        WHERE category_id = :category_id
+                        ORDER BY id
+                    """),
+                    {"category_id": category_id}
+                )
+                for row in result:
+                    yield self._question_row(columns, row)
+        except Exception as e:
+            logger.error(f"Error streaming questions for category {category_id}: {e}")
+            raise
+
+    def get_questions_page(self, category_id: int, after_id: int = 0, limit: int = 500,
+                           columns: Optional[Sequence[str]] = None) -> List[Dict]:
+        """Keyset-paginated questions of a category; pass the last returned id as `after_id`"""
+        columns = self._question_columns(columns)
+        if "id" not in columns:
+            columns = ("id",) + columns
+        try:
+            with self.engine.connect() as connection:
+                result = connection.execute(
+                    text(f"""
+                        SELECT {", ".join(columns)} 
+                        FROM quiz_questions 
+                        WHERE category_id = :category_id AND id > :after_id
+                        ORDER BY id
+                        LIMIT :limit
+                    """),
+                    {"category_id": category_id, "after_id": after_id, "limit": limit}
+                )
+                return [self._question_row(columns, row) for row in result]
+        except Exception as e:
+            logger.error(f"Error getting questions page for category {category_id}: {e}")
+            return []
+
+    def count_questions_by_category(self) -> Dict[int, int]:
+        """Count stored questions per category with a single aggregated query"""
+        try:
+            with self.engine.connect() as connection:
+                result = connection.execute(
+                    text("""
+                        SELECT category_id, COUNT(*) 
+                        FROM quiz_questions 
+                        GROUP BY category_id
+                    """)
+                )
+                return {row[0]: row[1] for row in result}
+        except Exception as e:
+            logger.error(f"Error counting questions by category: {e}")
+            raise
+
     def insert_question(self, question_data: Dict, category_id: int) -> bool:
         """Insert a new question into the database"""
         try:
-            with self.engine.begin() as connection:
+            with metrics.timer("db_insert"), self.engine.begin() as connection:
                 connection.execute(
                     text("""
                         INSERT INTO quiz_questions 
@@ -72,16 +216,285 @@ class Database:
                         "category_id": category_id,
                         "question": question_data["question"],
                         "correct_answer": question_data["correct_answer"],
-                        "options": question_data["options"],
+                        "options": self._encode_options(question_data["options"]),
                         "difficulty": question_data.get("difficulty", "medium"),
                         "score": question_data.get("score", 5)
                     }
                 )
+            metrics.increment("rows_inserted")
+            self._notify_write(category_id)
             return True
         except Exception as e:
             logger.error(f"Error inserting question for category {category_id}: {e}")
+            metrics.increment("rows_failed")
             return False
 
+    def insert_questions(self, questions: List[Dict], category_id: int,
+                         on_insert: Optional[Callable] = None) -> Dict:
+        """Insert a parsed batch of questions in a single transaction.
+
+        Returns {"ids": [...], "failed": [...]} where `ids` holds the new id of
+        every question (None for failed rows) and `failed` lists
+        {"index", "error"} entries. The batch is written with one multi-row
+        INSERT; if that fails, rows are retried one by one inside SAVEPOINTs so
+        a single bad row does not lose the rest of the batch.
+
+        `on_insert(connection, stored)` runs in the same transaction once the
+        rows are written, e.g. to record progress atomically with them; if it
+        raises, nothing is committed.
+        """
+        ids: List[Optional[int]] = [None] * len(questions)
+        failed: List[Dict] = []
+        rows = []
+        for index, question_data in enumerate(questions):
+            try:
+                rows.append((index, {
+                    "category_id": category_id,
+                    "question": question_data["question"],
+                    "correct_answer": question_data["correct_answer"],
+                    "options": self._encode_options(question_data["options"]),
+                    "difficulty": question_data.get("difficulty", "medium"),
+                    "score": question_data.get("score", 5)
+                }))
+            except KeyError as e:
+                failed.append({"index": index, "error": f"missing field {e}"})
+
+        if not rows:
+            return {"ids": ids, "failed": failed}
+
+        columns = ("category_id", "question", "correct_answer", "options", "difficulty", "score")
+        try:
+            with metrics.timer("db_insert"), self.engine.begin() as connection:
+                try:
+                    with connection.begin_nested():
+                        values = ", ".join(
+                            "(" + ", ".join(f":{column}_{n}" for column in columns) + ")"
+                            for n in range(len(rows))
+                        )
+                        params = {
+                            f"{column}_{n}": row[column]
+                            for n, (_, row) in enumerate(rows)
+                            for column in columns
+                        }
+                        result = connection.execute(
+                            text(f"""
+                                INSERT INTO quiz_questions 
+                                (category_id, question, correct_answer, options, difficulty, score) 
+                                VALUES {values}
+                                RETURNING id, question, correct_answer
+                            """),
+                            params
+                        )
+                        # RETURNING order is not guaranteed to follow VALUES order, so match rows by content;
+                        # rows with the same question and answer are interchangeable
+                        pending: Dict[Tuple[str, str], List[int]] = {}
+                        for index, row in rows:
+                            pending.setdefault((row["question"], row["correct_answer"]), []).append(index)
+                        for new_id, question, correct_answer in result:
+                            ids[pending[(question, correct_answer)].pop(0)] = new_id
+                except Exception as e:
+                    logger.warning(f"Bulk insert failed for category {category_id}, retrying row by row: {e}")
+                    for index, row in rows:
+                        try:
+                            with connection.begin_nested():
+                                ids[index] = connection.execute(
+                                    text("""
+                                        INSERT INTO quiz_questions 
+                                        (category_id, question, correct_answer, options, difficulty, score) 
+                                        VALUES (:category_id, :question, :correct_answer, :options, :difficulty, :score)
+                                        RETURNING id
+                                    """),
+                                    row
+                                ).scalar()
+                        except Exception as row_error:
+                            failed.append({"index": index, "error": str(row_error)})
+                stored = sum(1 for new_id in ids if new_id is not None)
+                if on_insert is not None and stored:
+                    on_insert(connection, stored)
+        except Exception as e:
+            logger.error(f"Error inserting questions for category {category_id}: {e}")
+            # Nothing from this transaction was committed
+            row_indices = {index for index, _ in rows}
+            failed = [failure for failure in failed if failure["index"] not in row_indices]
+            failed.extend({"index": index, "error": str(e)} for index, _ in rows)
+            ids = [None] * len(questions)
+
+        failed.sort(key=lambda failure: failure["index"])
+        metrics.increment("rows_inserted", len(questions) - len(failed))
+        metrics.increment("rows_failed", len(failed))
+        if len(failed) < len(questions):
+            self._notify_write(category_id)
+        return {"ids": ids, "failed": failed}
+
+    def update_questions(self, updates: List[Dict]) -> int:
+        """Apply {"id", "question", "correct_answer", "options"} updates in one transaction, return rows changed"""
+        if not updates:
+            return 0
+        rows = [{**update, "options": self._encode_options(update["options"])} for update in updates]
+        with metrics.timer("db_update"), self.engine.begin() as connection:
+            result = connection.execute(
+                text("""
+                    UPDATE quiz_questions 
+                    SET question = :question, correct_answer = :correct_answer, options = :options
+                    WHERE id = :id
+                """),
+                rows
+            )
+        metrics.increment("rows_updated", result.rowcount)
+        self._notify_write(None)
+        return result.rowcount
+
+    def _run_copy(self, statements: List[str], file) -> List[int]:
+        """Run COPY-based statements in one transaction on the raw psycopg2 connection.
+
+        `file` is passed to the COPY statement; returns the rowcount of every
+        statement.
+        """
+        connection = self.engine.raw_connection()
+        try:
+            cursor = connection.cursor()
+            rowcounts = []
+            for statement in statements:
+                if "STDIN" in statement or "STDOUT" in statement:
+                    cursor.copy_expert(statement, file)
+                else:
+                    cursor.execute(statement)
+                rowcounts.append(cursor.rowcount)
+            connection.commit()
+            return rowcounts
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+    def iter_export_chunks(self, category_id: Optional[int] = None, chunk_size: int = 5000) -> Iterator[List[Dict]]:
+        """Stream quiz_questions (joined with the category slug) in id order, `chunk_size` rows at a time"""
+        from question_bank import EXPORT_FIELDS
+
+        where = "WHERE q.category_id = :category_id" if category_id is not None else ""
+        with self.engine.connect() as connection:
+            result = connection.execution_options(yield_per=chunk_size).execute(
+                text(f"""
+                    SELECT q.id, q.category_id, c.slug, q.question, q.correct_answer, q.options, q.difficulty, q.score
+                    FROM quiz_questions q
+                    LEFT JOIN categories c ON c.id = q.category_id
+                    {where}
+                    ORDER BY q.id
+                """),
+                {"category_id": category_id}
+            )
+            for rows in result.partitions():
+                chunk = [dict(zip(EXPORT_FIELDS, row)) for row in rows]
+                for record in chunk:
+                    record["options"] = self._decode_options(record["options"])
+                yield chunk
+
+    def export_questions(self, path: str, chunk_size: int = 5000, category_id: Optional[int] = None) -> int:
+        """Dump quiz_questions to a .jsonl[.gz] or .parquet file with constant memory.
+
+        On Postgres, JSONL dumps are produced by the server with COPY and
+        streamed straight into the file. Returns the number of exported rows.
+        """
+        from question_bank import JSONL, detect_format, open_binary, write_chunks
+
+        if self.engine.dialect.name == "postgresql" and detect_format(path) == JSONL:
+            where = f"WHERE q.category_id = {int(category_id)}" if category_id is not None else ""
+            # CSV with control characters as quote/delimiter passes the JSON text through unescaped
+            sql = f"""
+                COPY (
+                    SELECT json_build_object(
+                        'id', q.id, 'category_id', q.category_id, 'category_slug', c.slug,
+                        'question', q.question, 'correct_answer', q.correct_answer, 'options', q.options,
+                        'difficulty', q.difficulty, 'score', q.score
+                    )
+                    FROM quiz_questions q
+                    LEFT JOIN categories c ON c.id = q.category_id
+                    {where}
+                    ORDER BY q.id
+                ) TO STDOUT WITH (FORMAT csv, QUOTE e'\\x01', DELIMITER e'\\x02')
+            """
+            with metrics.timer("db_export"), open_binary(path, "w") as f:
+                count = self._run_copy([sql], f)[0]
+        else:
+            with metrics.timer("db_export"):
+                count = write_chunks(path, self.iter_export_chunks(category_id, chunk_size))
+        metrics.increment("rows_exported", count)
+        logger.info(f"Exported {count} questions to {path}")
+        return count
+
+    def import_questions(self, path: str, chunk_size: int = 5000) -> Dict:
+        """Load a question dump written by export_questions (or a legacy JSON array).
+
+        Rows are mapped to local categories by `category_slug` when present,
+        falling back to `category_id`; ids are always assigned by this
+        database. On Postgres, JSONL dumps are loaded with COPY into a staging
+        table in one transaction; elsewhere every chunk is one executemany
+        transaction. Returns {"imported": n, "skipped": n}.
+        """
+        from question_bank import JSONL, detect_format, open_binary, read_chunks
+
+        if self.engine.dialect.name == "postgresql" and detect_format(path) == JSONL:
+            statements = [
+                "CREATE TEMP TABLE quiz_questions_import (doc jsonb) ON COMMIT DROP",
+                "COPY quiz_questions_import (doc) FROM STDIN WITH (FORMAT csv, QUOTE e'\\x01', DELIMITER e'\\x02')",
+                """
+                INSERT INTO quiz_questions (category_id, question, correct_answer, options, difficulty, score)
+                SELECT COALESCE(c.id, by_id.id), i.doc->>'question', i.doc->>'correct_answer',
+                       ARRAY(SELECT jsonb_array_elements_text(i.doc->'options')),
+                       COALESCE(i.doc->>'difficulty', 'medium'), COALESCE((i.doc->>'score')::int, 5)
+                FROM quiz_questions_import i
+                LEFT JOIN categories c ON c.slug = i.doc->>'category_slug'
+                LEFT JOIN categories by_id ON by_id.id = (i.doc->>'category_id')::int
+                WHERE COALESCE(c.id, by_id.id) IS NOT NULL
+                """,
+            ]
+            with metrics.timer("db_import"), open_binary(path, "r") as f:
+                _, staged, imported = self._run_copy(statements, f)
+            if staged > imported:
+                logger.warning(f"Skipped {staged - imported} questions from {path} with unknown categories")
+            metrics.increment("rows_imported", imported)
+            self._notify_write(None)
+            return {"imported": imported, "skipped": staged - imported}
+
+        categories = self.get_categories()
+        ids_by_slug = {category["slug"]: category["id"] for category in categories}
+        known_ids = set(ids_by_slug.values())
+        imported = skipped = 0
+        with metrics.timer("db_import"):
+            for chunk in read_chunks(path, chunk_size):
+                rows = []
+                for record in chunk:
+                    category_id = ids_by_slug.get(record.get("category_slug"), record.get("category_id"))
+                    if category_id not in known_ids:
+                        skipped += 1
+                        continue
+                    rows.append({
+                        "category_id": category_id,
+                        "question": record["question"],
+                        "correct_answer": record["correct_answer"],
+                        "options": self._encode_options(list(record["options"])),
+                        "difficulty": record.get("difficulty") or "medium",
+                        "score": record.get("score") or 5
+                    })
+                if not rows:
+                    continue
+                with self.engine.begin() as connection:
+                    connection.execute(
+                        text("""
+                            INSERT INTO quiz_questions 
+                            (category_id, question, correct_answer, options, difficulty, score) 
+                            VALUES (:category_id, :question, :correct_answer, :options, :difficulty, :score)
+                        """),
+                        rows
+                    )
+                imported += len(rows)
+        if skipped:
+            logger.warning(f"Skipped {skipped} questions from {path} with unknown categories")
+        metrics.increment("rows_imported", imported)
+        self._notify_write(None)
+        return {"imported": imported, "skipped": skipped}
+
     def save_user_score(self, user_id: int, category_id: int, score: int, correct_answers: int) -> bool:
         """Save user's quiz score"""
         try:
@@ -99,8 +512,30 @@ class Database:
                         "correct_answers": correct_answers
                     }
                 )
+                # Keep the leaderboard aggregate in step with the score history
+                connection.execute(
+                    text("""
+                        INSERT INTO user_category_stats 
+                        (user_id, category_id, attempts, total_score, best_score, total_correct, last_completed_at) 
+                        VALUES (:user_id, :category_id, 1, :score, :score, :correct_answers, CURRENT_TIMESTAMP)
+                        ON CONFLICT (user_id, category_id) DO UPDATE SET
+                            attempts = user_category_stats.attempts + 1,
+                            total_score = user_category_stats.total_score + excluded.total_score,
+                            best_score = CASE WHEN excluded.best_score > user_category_stats.best_score
+                                THEN excluded.best_score ELSE user_category_stats.best_score END,
+                            total_correct = user_category_stats.total_correct + excluded.total_correct,
+                            last_completed_at = excluded.last_completed_at
+                    """),
+                    {
+                        "user_id": user_id,
+                        "category_id": category_id,
+                        "score": score,
+                        "correct_answers": correct_answers
+                    }
+                )
             return True
         except Exception as e:
+            # Most likely user_category_stats is missing: run `python schema.py migrate-leaderboard`
             logger.error(f"Error saving score for user {user_id}: {e}")
             return False
 
@@ -130,23 +565,141 @@ class Database:
             logger.error(f"Error getting scores for user {user_id}: {e}")
             return []
 
-    def get_category_by_slug(self, slug: str) -> Optional[Dict]:
-        """Get a category by its slug"""
+    def get_leaderboard(self, category_id: int, limit: int = 20, cursor: Optional[Dict] = None,
+                        order_by: str = "total_score") -> Dict:
+        """One page of a category leaderboard from the user_category_stats aggregate.
+
+        Pages are keyset-paginated on (score DESC, user_id): pass the returned
+        `next_cursor` to get the following page. Returns {"entries": [...],
+        "next_cursor": {...} or None}.
+        """
+        if order_by not in LEADERBOARD_ORDERS:
+            raise ValueError(f"Leaderboard can be ordered by {LEADERBOARD_ORDERS}, not {order_by}")
+        params = {"category_id": category_id, "limit": limit}
+        after = ""
+        if cursor is not None:
+            after = f"AND ({order_by} < :after_score OR ({order_by} = :after_score AND user_id > :after_user_id))"
+            params.update(after_score=cursor["score"], after_user_id=cursor["user_id"])
+        first_rank = cursor["rank"] + 1 if cursor is not None else 1
         try:
             with self.engine.connect() as connection:
                 result = connection.execute(
-                    text("SELECT id, name, name_ru, slug FROM categories WHERE slug = :slug"),
-                    {"slug": slug}
-                ).first()
-                
-                if result:
-                    return {
-                        "id": result[0],
-                        "name": result[1],
-                        "name_ru": result[2],
-                        "slug": result[3]
-                    }
-                return None
+                    text(f"""
+                        SELECT user_id, {order_by}, attempts, total_score, best_score, total_correct, last_completed_at
+                        FROM user_category_stats
+                        WHERE category_id = :category_id {after}
+                        ORDER BY {order_by} DESC, user_id
+                        LIMIT :limit
+                    """),
+                    params
+                )
+                entries = [
+                    {
+                        "rank": first_rank + index,
+                        "user_id": row[0],
+                        "score": row[1],
+                        "attempts": row[2],
+                        "total_score": row[3],
+                        "best_score": row[4],
+                        "total_correct": row[5],
+                        "last_completed_at": row[6]
+                    } for index, row in enumerate(result)
+                ]
+        except Exception as e:
+            logger.error(f"Error getting leaderboard for category {category_id}: {e}")
+            return {"entries": [], "next_cursor": None}
+        next_cursor = None
+        if len(entries) == limit:
+            last = entries[-1]
+            next_cursor = {"score": last["score"], "user_id": last["user_id"], "rank": last["rank"]}
+        return {"entries": entries, "next_cursor": next_cursor}
+
+    def get_top_per_category(self, limit: int = 3, order_by: str = "total_score") -> Dict[int, List[Dict]]:
+        """Top `limit` users of every category in one query"""
+        if order_by not in LEADERBOARD_ORDERS:
+            raise ValueError(f"Leaderboard can be ordered by {LEADERBOARD_ORDERS}, not {order_by}")
+        try:
+            with self.engine.connect() as connection:
+                result = connection.execute(
+                    text(f"""
+                        SELECT category_id, rank, user_id, score FROM (
+                            SELECT category_id, user_id, {order_by} AS score,
+                                   ROW_NUMBER() OVER (PARTITION BY category_id ORDER BY {order_by} DESC, user_id) AS rank
+                            FROM user_category_stats
+                        ) ranked
+                        WHERE rank <= :limit
+                        ORDER BY category_id, rank
+                    """),
+                    {"limit": limit}
+                )
+                top: Dict[int, List[Dict]] = {}
+                for row in result:
+                    top.setdefault(row[0], []).append({"rank": row[1], "user_id": row[2], "score": row[3]})
+                return top
+        except Exception as e:
+            logger.error(f"Error getting top users per category: {e}")
+            return {}
+
+    def get_user_rank(self, user_id: int, category_id: int, order_by: str = "total_score") -> Optional[int]:
+        """1-based position of a user on a category leaderboard, None if they have no scores there"""
+        if order_by not in LEADERBOARD_ORDERS:
+            raise ValueError(f"Leaderboard can be ordered by {LEADERBOARD_ORDERS}, not {order_by}")
+        try:
+            with self.engine.connect() as connection:
+                return connection.execute(
+                    text(f"""
+                        SELECT 1 + (
+                            SELECT COUNT(*) FROM user_category_stats other
+                            WHERE other.category_id = me.category_id
+                              AND (other.{order_by} > me.{order_by}
+                                   OR (other.{order_by} = me.{order_by} AND other.user_id < me.user_id))
+                        )
+                        FROM user_category_stats me
+                        WHERE me.user_id = :user_id AND me.category_id = :category_id
+                    """),
+                    {"user_id": user_id, "category_id": category_id}
+                ).scalar()
         except Exception as e:
-            logger.error(f"Error getting category by slug {slug}: {e}")
-            return None 
\ No newline at end of file
+            logger.error(f"Error getting rank of user {user_id} in category {category_id}: {e}")
+            return None
+
+    def get_user_summary(self, user_id: int) -> Dict:
+        """Per-category and overall totals of a user, read from the leaderboard aggregate"""
+        try:
+            with self.engine.connect() as connection:
+                result = connection.execute(
+                    text("""
+                        SELECT s.category_id, c.name, s.attempts, s.total_score, s.best_score, s.total_correct, 
+                               s.last_completed_at
+                        FROM user_category_stats s
+                        JOIN categories c ON s.category_id = c.id
+                        WHERE s.user_id = :user_id
+                        ORDER BY s.total_score DESC
+                    """),
+                    {"user_id": user_id}
+                )
+                categories = [
+                    {
+                        "category_id": row[0],
+                        "category_name": row[1],
+                        "attempts": row[2],
+                        "total_score": row[3],
+                        "best_score": row[4],
+                        "total_correct": row[5],
+                        "last_completed_at": row[6]
+                    } for row in result
+                ]
+        except Exception as e:
+            logger.error(f"Error getting summary for user {user_id}: {e}")
+            categories = []
+        return {
+            "user_id": user_id,
+            "attempts": sum(category["attempts"] for category in categories),
+            "total_score": sum(category["total_score"] for category in categories),
+            "total_correct": sum(category["total_correct"] for category in categories),
+            "categories": categories
+        }
+
+    def get_category_by_slug(self, slug: str) -> Optional[Dict]:
+        """Get a category by its slug"""
+        return self.categories.by_slug(slug) 
\ No newline at end of file
@@ -0,0 +1,247 @@
+import argparse
+import json
+import logging
+import re
+import threading
+from array import array
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+_MASK_32 = (1 << 32) - 1
+_MASK_64 = (1 << 64) - 1
+_EMPTY_BIN = 1 << 40
+_DENSIFY_OFFSET = 1 << 32
+
+UNIQUE = "unique"
+FLAGGED = "flagged"
+DUPLICATE = "duplicate"
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and strip punctuation so formatting changes do not matter"""
+    return " ".join(_WORD_RE.findall((text or "").lower()))
+
+
+def shingles(text: str, size: int = 5) -> set:
+    """Character n-grams of the normalized text (robust to Russian word endings)"""
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+class DuplicateIndex:
+    """In-memory MinHash/LSH index of the questions of one category.
+
+    Lookups hash the candidate once and only compare against questions that
+    share an LSH band, so the cost does not depend on the index size.
+    Exact (normalized) repeats are caught by a plain hash lookup.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.8,
+        flag_threshold: float = 0.5,
+        num_perm: int = 32,
+        bands: int = 8,
+        shingle_size: int = 5,
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.flag_threshold = flag_threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self._signatures: Dict[int, array] = {}
+        self._answers: Dict[int, int] = {}
+        self._texts: Dict[int, str] = {}
+        self._exact: Dict[int, int] = {}
+        self._buckets: List[Dict[Tuple, List[int]]] = [defaultdict(list) for _ in range(bands)]
+        self._next_key = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    @classmethod
+    def from_questions(cls, questions: Iterable[Dict], **kwargs) -> "DuplicateIndex":
+        """Build an index seeded from already stored questions"""
+        index = cls(**kwargs)
+        for question in questions:
+            index.add(question["question"], question.get("correct_answer", ""))
+        return index
+
+    def _signature(self, normalized: str) -> array:
+        # One-permutation hashing: a single hash per shingle, min value per bin,
+        # empty bins filled from the next non-empty one (rotation densification)
+        num_bins = self.num_perm
+        signature = [_EMPTY_BIN] * num_bins
+        for shingle in shingles(normalized, self.shingle_size):
+            value = hash(shingle) & _MASK_64
+            bin_index = value % num_bins
+            value = (value // num_bins) & _MASK_32
+            if value < signature[bin_index]:
+                signature[bin_index] = value
+        if all(value == _EMPTY_BIN for value in signature):
+            return array('Q', signature)
+        original = list(signature)
+        for i in range(num_bins):
+            if original[i] == _EMPTY_BIN:
+                offset = 1
+                while original[(i + offset) % num_bins] == _EMPTY_BIN:
+                    offset += 1
+                signature[i] = original[(i + offset) % num_bins] + offset * _DENSIFY_OFFSET
+        return array('Q', signature)
+
+    def _band_keys(self, signature: array) -> List[Tuple]:
+        rows = self.rows
+        return [tuple(signature[band * rows:(band + 1) * rows]) for band in range(self.bands)]
+
+    def _similarity(self, left: array, right: array) -> float:
+        return sum(1 for x, y in zip(left, right) if x == y) / self.num_perm
+
+    def _check(self, normalized: str, answer_hash: int, signature: array, band_keys: List[Tuple]) -> Dict:
+        exact = self._exact.get(hash(normalized))
+        if exact is not None and self._texts[exact] == normalized:
+            return {"status": DUPLICATE, "similarity": 1.0, "match": self._texts[exact]}
+
+        candidates = set()
+        for band, key in enumerate(band_keys):
+            candidates.update(self._buckets[band].get(key, ()))
+
+        best_key, best_similarity = None, 0.0
+        for candidate in candidates:
+            similarity = self._similarity(signature, self._signatures[candidate])
+            if similarity > best_similarity:
+                best_key, best_similarity = candidate, similarity
+
+        status = UNIQUE
+        if best_key is not None:
+            same_answer = self._answers[best_key] == answer_hash
+            if best_similarity >= self.threshold or (same_answer and best_similarity >= self.flag_threshold):
+                status = DUPLICATE
+            elif best_similarity >= self.flag_threshold:
+                status = FLAGGED
+        return {
+            "status": status,
+            "similarity": best_similarity,
+            "match": self._texts[best_key] if best_key is not None else None,
+        }
+
+    def check(self, question: str, correct_answer: str = "") -> Dict:
+        """Classify a candidate question as unique, flagged or duplicate"""
+        normalized = normalize_text(question)
+        signature = self._signature(normalized)
+        with self._lock:
+            return self._check(normalized, hash(normalize_text(correct_answer)), signature,
+                               self._band_keys(signature))
+
+    def add(self, question: str, correct_answer: str = "") -> int:
+        """Add a question to the index and return its key"""
+        normalized = normalize_text(question)
+        signature = self._signature(normalized)
+        with self._lock:
+            return self._add(normalized, hash(normalize_text(correct_answer)), signature,
+                             self._band_keys(signature))
+
+    def _add(self, normalized: str, answer_hash: int, signature: array, band_keys: List[Tuple]) -> int:
+        key = self._next_key
+        self._next_key += 1
+        self._signatures[key] = signature
+        self._answers[key] = answer_hash
+        self._texts[key] = normalized
+        self._exact.setdefault(hash(normalized), key)
+        for band, band_key in enumerate(band_keys):
+            self._buckets[band][band_key].append(key)
+        return key
+
+    def check_and_add(self, question: str, correct_answer: str = "") -> Tuple[Dict, Optional[int]]:
+        """Atomically check a question and, unless it is a duplicate, reserve it in the index.
+
+        Returns the verdict and the new key (None for duplicates) so a failed
+        insert can be rolled back with `discard`.
+        """
+        normalized = normalize_text(question)
+        answer_hash = hash(normalize_text(correct_answer))
+        signature = self._signature(normalized)
+        band_keys = self._band_keys(signature)
+        with self._lock:
+            verdict = self._check(normalized, answer_hash, signature, band_keys)
+            if verdict["status"] == DUPLICATE:
+                return verdict, None
+            return verdict, self._add(normalized, answer_hash, signature, band_keys)
+
+    def discard(self, key: int) -> None:
+        """Remove a question from the index (e.g. after a failed insert)"""
+        with self._lock:
+            signature = self._signatures.pop(key, None)
+            if signature is None:
+                return
+            self._answers.pop(key, None)
+            normalized = self._texts.pop(key)
+            if self._exact.get(hash(normalized)) == key:
+                del self._exact[hash(normalized)]
+            for band, band_key in enumerate(self._band_keys(signature)):
+                bucket = self._buckets[band].get(band_key)
+                if bucket and key in bucket:
+                    bucket.remove(key)
+
+
+def find_duplicates(questions: Iterable[Dict], **kwargs) -> List[Dict]:
+    """Return every stored question that duplicates or resembles an earlier one"""
+    index = DuplicateIndex(**kwargs)
+    report = []
+    for question in questions:
+        verdict, _ = index.check_and_add(question["question"], question.get("correct_answer", ""))
+        if verdict["status"] != UNIQUE:
+            report.append({
+                "status": verdict["status"],
+                "similarity": round(verdict["similarity"], 3),
+                "question": question["question"],
+                "match": verdict["match"],
+            })
+    return report
+
+
+def dedup_report(db, **kwargs) -> Dict[int, List[Dict]]:
+    """Offline near-duplicate report over the whole quiz_questions table"""
+    report = {}
+    for category in db.get_categories():
+        count = 0
+
+        def counted(questions):
+            nonlocal count
+            for question in questions:
+                count += 1
+                yield question
+
+        questions = db.iter_questions(category["id"], columns=("question", "correct_answer"))
+        findings = find_duplicates(counted(questions), **kwargs)
+        duplicates = sum(1 for f in findings if f["status"] == DUPLICATE)
+        logger.info(f"{category['name']}: {count} questions, "
+                    f"{duplicates} duplicates, {len(findings) - duplicates} flagged")
+        report[category["id"]] = findings
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report near-duplicate questions in quiz_questions")
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument("--flag-threshold", type=float, default=0.5)
+    args = parser.parse_args()
+
+    from database import Database
+
+    report = dedup_report(Database(), threshold=args.threshold, flag_threshold=args.flag_threshold)
+    for category_id, findings in report.items():
+        for finding in findings:
+            print(json.dumps({"category_id": category_id, **finding}, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,189 @@
+from abc import ABC, abstractmethod
+import logging
+import os
+import random
+import re
+import threading
+import time
+from typing import Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class LLMError(Exception):
+    """Base class for errors raised by LLM backends"""
+
+
+class RateLimitError(LLMError):
+    """The provider rejected the call because of quota or rate limits"""
+
+
+class TransientLLMError(LLMError):
+    """A temporary provider failure (timeout, 5xx, dropped stream)"""
+
+
+class LLMBackend(ABC):
+    """Minimal text-in/text-out interface the generation pipeline talks to.
+
+    Backends raise RateLimitError or TransientLLMError for provider failures
+    that are worth retrying, so callers never see provider-specific exceptions.
+    """
+
+    model = "unknown"
+    temperature = 0.0
+
+    @abstractmethod
+    def stream(self, prompt: str) -> Iterator[str]:
+        """Yield the response text in chunks"""
+
+    def invoke(self, prompt: str) -> str:
+        return "".join(self.stream(prompt))
+
+
+class GoogleGenAIBackend(LLMBackend):
+    """Gemini through langchain-google-genai.
+
+    The underlying client keeps one long-lived channel that multiplexes
+    concurrent streams, and it is safe to call from several threads. Share a
+    single instance (see shared_backend) instead of creating one per category,
+    so connections and TLS sessions are set up once per process.
+    """
+
+    def __init__(self, model: str = "gemini-pro", temperature: float = 0.7, api_key: Optional[str] = None):
+        from google.api_core import exceptions as google_exceptions
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        self.model = model
+        self.temperature = temperature
+        self.llm = ChatGoogleGenerativeAI(
+            model=model,
+            temperature=temperature,
+            google_api_key=api_key or os.getenv("GOOGLE_API_KEY")
+        )
+        self._rate_limit_errors = (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)
+        self._transient_errors = (
+            google_exceptions.ServerError,
+            google_exceptions.DeadlineExceeded,
+            google_exceptions.RetryError,
+            ConnectionError,
+            TimeoutError,
+        )
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        try:
+            for chunk in self.llm.stream(prompt):
+                yield chunk.content
+        except self._rate_limit_errors as e:
+            raise RateLimitError(f"{type(e).__name__}: {e}") from e
+        except self._transient_errors as e:
+            raise TransientLLMError(f"{type(e).__name__}: {e}") from e
+
+
+_NUM_QUESTIONS_RE = re.compile(r'Generate (\d+) new')
+_WORDS = (
+    "класс объект метод поток коллекция список карта интерфейс наследование исключение "
+    "память сборщик строка массив цикл переменная модификатор конструктор пакет аннотация "
+    "лямбда стрим итератор очередь блокировка монитор ссылка примитив упаковка дженерик"
+).split()
+_DIFFICULTY_SCORES = {"easy": 5, "medium": 10, "hard": 15}
+
+
+class FakeLLMBackend(LLMBackend):
+    """Deterministic local stand-in that emits valid QUESTION/ANSWER/OPTIONS blocks.
+
+    Latency, jitter, error rate and the share of malformed blocks are
+    configurable so the scheduler, parser and database layers can be load
+    tested without a live API.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        malformed_rate: float = 0.0,
+        chunk_size: int = 256,
+        seed: int = 0,
+    ):
+        self.model = "fake"
+        self.temperature = 0.0
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.malformed_rate = malformed_rate
+        self.chunk_size = max(1, chunk_size)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._counter = 0
+
+    def _question_block(self, rng: random.Random, number: int) -> str:
+        difficulty = rng.choice(list(_DIFFICULTY_SCORES))
+        topic = " ".join(rng.choice(_WORDS) for _ in range(6))
+        answer = f"Вариант {number}: {rng.choice(_WORDS)} {rng.choice(_WORDS)}"
+        lines = [
+            f"QUESTION: Вопрос {number}: как связаны {topic}?",
+            f"ANSWER: {answer}",
+            f"DIFFICULTY: {difficulty}",
+            f"SCORE: {_DIFFICULTY_SCORES[difficulty]}",
+            "OPTIONS:",
+            f"1. {answer}",
+            f"2. Неверно {number}-2 {rng.choice(_WORDS)}",
+            f"3. Неверно {number}-3 {rng.choice(_WORDS)}",
+            f"4. Неверно {number}-4 {rng.choice(_WORDS)}",
+        ]
+        if rng.random() < self.malformed_rate:
+            # Simulate a truncated block with a missing option
+            lines = lines[:-1]
+        return "\n".join(lines) + "\n===\n"
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        match = _NUM_QUESTIONS_RE.search(prompt)
+        num_questions = int(match.group(1)) if match else 5
+
+        with self._lock:
+            rng = random.Random(self._random.getrandbits(64))
+            start = self._counter
+            self._counter += num_questions
+            roll = self._random.random()
+
+        delay = max(0.0, self.latency + rng.uniform(-self.jitter, self.jitter))
+        if roll < self.rate_limit_rate:
+            time.sleep(delay / 10)
+            raise RateLimitError("fake backend: rate limit exceeded")
+
+        text = "".join(self._question_block(rng, start + i + 1) for i in range(num_questions))
+        chunks = [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)]
+        per_chunk = delay / len(chunks)
+        fail_at = rng.randrange(len(chunks)) if roll < self.rate_limit_rate + self.error_rate else None
+
+        for index, chunk in enumerate(chunks):
+            if per_chunk:
+                time.sleep(per_chunk)
+            if index == fail_at:
+                raise TransientLLMError("fake backend: stream interrupted")
+            yield chunk
+
+
+_shared_backends: Dict[Tuple, LLMBackend] = {}
+_shared_lock = threading.Lock()
+
+
+def shared_backend(name: str = "google", **kwargs) -> LLMBackend:
+    """Process-wide backend for `name` and `kwargs`, created on first use"""
+    key = (name, tuple(sorted(kwargs.items())))
+    with _shared_lock:
+        backend = _shared_backends.get(key)
+        if backend is None:
+            backend = _shared_backends[key] = create_backend(name, **kwargs)
+        return backend
+
+
+def create_backend(name: str = "google", **kwargs) -> LLMBackend:
+    """Build a backend by name ("google" or "fake")"""
+    if name == "google":
+        return GoogleGenAIBackend(**kwargs)
+    if name == "fake":
+        return FakeLLMBackend(**kwargs)
+    raise ValueError(f"Unknown LLM backend: {name}")
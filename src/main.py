@@ -1,38 +1,60 @@
+import argparse
 import logging
 from database import Database
 from question_generator import QuestionGenerator
+from dedup import DUPLICATE, FLAGGED
+from metrics import metrics
+from retry import CircuitBreaker, RetryPolicy, RetryState, classify_error, PARSE
+from llm_backends import shared_backend
+from batch_sizing import BatchSizer
+from scheduler import GenerationScheduler, load_existing_questions
 import time
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
-def generate_questions_for_category(db, category_id, category_name, category_name_ru, num_questions=30):
+def generate_questions_for_category(db, category_id, category_name, category_name_ru, num_questions=30,
+                                    cache=None, backend=None, retry_policy=None, circuit_breaker=None,
+                                    batch_sizer=None):
     logger.info(f"Starting question generation for {category_name} (ID: {category_id})")
     
-    generator = QuestionGenerator(category_name, category_name_ru)
-    existing_questions = db.get_existing_questions(category_id)
-    logger.info(f"Found {len(existing_questions)} existing questions for {category_name}")
+    generator = QuestionGenerator(category_name, category_name_ru, backend=backend, cache=cache)
+    existing_questions, dedup_index, count = load_existing_questions(db, category_id)
+    logger.info(f"Found {count} existing questions for {category_name}")
+    
+    retry = RetryState(retry_policy or RetryPolicy())
+    circuit_breaker = circuit_breaker or CircuitBreaker()
+    
+    def backoff(kind):
+        delay = retry.record_failure(kind)
+        metrics.increment("retries", category=category_name, kind=kind)
+        if delay is None:
+            return False
+        logger.info(f"Retrying in {delay:.1f}s ({kind}, attempt {retry.failures})")
+        metrics.increment("sleep_seconds", delay, category=category_name)
+        time.sleep(delay)
+        return True
     
     total_questions = 0
-    batch_size = 15
     
     while total_questions < num_questions:
         try:
+            waited = circuit_breaker.wait()
+            if waited:
+                metrics.increment("sleep_seconds", waited, category=category_name)
+            batch_size = batch_sizer.size(category_name) if batch_sizer is not None else 15
             current_batch = min(batch_size, num_questions - total_questions)
             logger.info(f"Generating batch of {current_batch} questions ({total_questions + 1}-{total_questions + current_batch})")
             
-            new_questions = generator.generate_questions(existing_questions, current_batch)
+            batch_started = time.perf_counter()
+            new_questions = generator.generate_questions(existing_questions, current_batch, count + total_questions)
+            circuit_breaker.record_success()
             
             # Handle single AIMessage response
             if hasattr(new_questions, 'content'):
                 new_questions = [new_questions]
             
             # Convert AIMessage to dictionary if needed
-            processed_questions = []
+            admitted = []
             for question in new_questions:
                 try:
                     # Handle both AIMessage objects and dictionary responses
@@ -42,35 +64,123 @@ def generate_questions_for_category(db, category_id, category_name, category_nam
                     else:
                         question_data = question
                     
-                    success = db.insert_question(question_data, category_id)
-                    if success:
+                    verdict, dedup_key = dedup_index.check_and_add(
+                        question_data['question'], question_data.get('correct_answer', '')
+                    )
+                    if verdict['status'] == DUPLICATE:
+                        metrics.increment("duplicates", category=category_name)
+                        logger.info(f"✗ Skipped near-duplicate ({verdict['similarity']:.2f}): {question_data['question']}")
+                        continue
+                    if verdict['status'] == FLAGGED:
+                        metrics.increment("flagged", category=category_name)
+                        logger.warning(f"Possible duplicate ({verdict['similarity']:.2f}): {question_data['question']}")
+                    
+                    admitted.append((question_data, dedup_key))
+                    if len(admitted) >= current_batch:
+                        break
+                except AttributeError as e:
+                    logger.error(f"Error processing question object: {str(e)}")
+                    logger.debug(f"Question object type: {type(question)}")
+                    continue
+            
+            # Insert the whole batch in one transaction
+            processed_questions = []
+            if admitted:
+                result = db.insert_questions([question_data for question_data, _ in admitted], category_id)
+                for (question_data, dedup_key), new_id in zip(admitted, result["ids"]):
+                    if new_id is not None:
                         total_questions += 1
+                        metrics.increment("accepted", category=category_name)
                         logger.info(f"✓ Added ({total_questions}/{num_questions}): {question_data['question']}")
                         processed_questions.append(question_data)
                     else:
+                        dedup_index.discard(dedup_key)
+                        metrics.increment("rejected", category=category_name)
                         logger.error(f"✗ Failed to add: {question_data['question']}")
-                except AttributeError as e:
-                    logger.error(f"Error processing question object: {str(e)}")
-                    logger.debug(f"Question object type: {type(question)}")
-                    continue
             
             existing_questions.extend(processed_questions)
             
-            # Only add delay if no questions were processed in this batch
-            if not processed_questions:
-                logger.info("No questions processed in this batch, waiting 5 seconds before retry...")
-                time.sleep(5)
+            last_call = generator.last_call or {}
+            if batch_sizer is not None and not last_call.get("cached"):
+                batch_sizer.record(
+                    category_name, current_batch, len(processed_questions), time.perf_counter() - batch_started,
+                    prompt_tokens=last_call.get("prompt_tokens"),
+                    response_tokens=last_call.get("response_tokens"),
+                    parsed=last_call.get("parsed"),
+                    complete=last_call.get("complete", True)
+                )
+            
+            # Only back off if no questions were processed in this batch
+            if processed_questions:
+                retry.record_success()
+            else:
+                logger.info("No questions processed in this batch")
+                if not backoff(PARSE):
+                    break
                 
         except Exception as e:
-            logger.error(f"Error in batch generation: {str(e)}")
+            kind = classify_error(e)
+            logger.error(f"Error in batch generation ({kind}): {str(e)}")
             logger.debug("Full error:", exc_info=True)
-            time.sleep(5)  # Only wait on error
+            metrics.increment("batch_errors", category=category_name, kind=kind)
+            circuit_breaker.record_failure()
+            if not backoff(kind):
+                break
             continue
     
-    logger.info(f"Successfully added {total_questions} new questions for {category_name}!")
+    if retry.exhausted:
+        metrics.increment("categories_abandoned", category=category_name)
+        logger.error(f"Giving up on {category_name} after {retry.failures} failed batches, "
+                     f"added {total_questions}/{num_questions} questions")
+    else:
+        logger.info(f"Successfully added {total_questions} new questions for {category_name}!")
     return total_questions
 
-def main():
+def parse_args(argv=None):
+    from config import (
+        GENERATION_MAX_WORKERS, GENERATION_PER_CATEGORY, GENERATION_REQUESTS_PER_SECOND, RESPONSE_CACHE_PATH,
+        LLM_BACKEND, REFILL_STATE_PATH, GENERATION_TOKEN_BUDGET
+    )
+
+    parser = argparse.ArgumentParser(description="Generate Java quiz questions for every category")
+    parser.add_argument("--num-questions", type=int, default=30,
+                        help="New questions to generate per category")
+    parser.add_argument("--concurrent", action="store_true",
+                        help="Run categories and batches concurrently on a worker pool")
+    parser.add_argument("--stream", action="store_true",
+                        help="With --concurrent, parse and insert questions while the LLM response streams in")
+    parser.add_argument("--max-workers", type=int, default=GENERATION_MAX_WORKERS,
+                        help="Global limit of concurrent LLM batches")
+    parser.add_argument("--per-category", type=int, default=GENERATION_PER_CATEGORY,
+                        help="Concurrent batches allowed per category")
+    parser.add_argument("--rate", type=float, default=GENERATION_REQUESTS_PER_SECOND,
+                        help="LLM requests per second across all workers (0 disables the limit)")
+    parser.add_argument("--cache", default=RESPONSE_CACHE_PATH,
+                        help="SQLite file for caching LLM responses (replays identical prompts offline)")
+    parser.add_argument("--metrics-out",
+                        help="Export run metrics to this file (Prometheus text for *.prom, JSON lines otherwise)")
+    parser.add_argument("--backend", choices=["google", "fake"], default=LLM_BACKEND,
+                        help="LLM backend; 'fake' emits synthetic questions for offline load tests")
+    parser.add_argument("--target", type=int,
+                        help="Refill job mode: top every category up to this many questions (resumable)")
+    parser.add_argument("--job-id", default="refill",
+                        help="Refill or worker job to start or resume; a job id keeps the --target or "
+                             "--num-questions it was started with")
+    parser.add_argument("--batch-size", type=int,
+                        help="Fixed questions per LLM call (default: adapt per category within --token-budget)")
+    parser.add_argument("--token-budget", type=int, default=GENERATION_TOKEN_BUDGET,
+                        help="Prompt plus expected response tokens allowed per LLM call when batch sizes adapt")
+    parser.add_argument("--worker", action="store_true",
+                        help="Worker mode: share the job with other processes through a queue table in the "
+                             "database (enqueues --target deficits or --num-questions per category first)")
+    parser.add_argument("--lease-seconds", type=float, default=300.0,
+                        help="With --worker, how long a claimed work item stays reserved without a heartbeat")
+    parser.add_argument("--state", default=REFILL_STATE_PATH,
+                        help="SQLite file holding refill job checkpoints (and the response cache by default)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
     try:
         db = Database()
         
@@ -78,23 +188,96 @@ def main():
         categories = db.get_categories()
         logger.info(f"Found {len(categories)} categories in database")
         
+        # One backend client shared by every category
+        backend = shared_backend(args.backend)
+        
+        # Refill jobs cache responses by default; their in-flight batches are checkpointed separately
+        cache_path = args.cache or (args.state if args.target is not None else None)
+        cache = None
+        if cache_path:
+            from response_cache import ResponseCache
+            cache = ResponseCache(cache_path)
+        
+        # One breaker for the shared backend, so a failing provider pauses every category
+        circuit_breaker = CircuitBreaker()
+        
+        batch_sizer = None
+        if args.batch_size is None:
+            batch_sizer = BatchSizer(token_budget=args.token_budget)
+        
         total_questions = 0
-        for category in categories:
-            questions_added = generate_questions_for_category(
-                db=db,
-                category_id=category['id'],
-                category_name=category['name'],
-                category_name_ru=category['name_ru']
+        if args.concurrent or args.target is not None or args.worker:
+            # Every category gets a cheap view of one generator: same client, cache and compiled prompt
+            base_generator = QuestionGenerator(backend=backend, cache=cache)
+            scheduler = GenerationScheduler(
+                db,
+                max_workers=args.max_workers,
+                per_category=args.per_category,
+                requests_per_second=args.rate,
+                stream=args.stream,
+                circuit_breaker=circuit_breaker,
+                generator_factory=base_generator.for_category,
+                batch_size=args.batch_size or 15,
+                batch_sizer=batch_sizer
             )
-            total_questions += questions_added
-            logger.info(f"Completed processing for {category['name']}")
-            logger.info("-" * 50)
+            if args.worker:
+                from refill_jobs import compute_deficits
+                from work_queue import QueueWorker, WorkQueue
+
+                queue = WorkQueue(db, lease_seconds=args.lease_seconds)
+                if args.target is not None:
+                    targets = compute_deficits(categories, db.count_questions_by_category(), args.target)
+                    parameters = {"target": args.target}
+                else:
+                    targets = {category['id']: args.num_questions for category in categories}
+                    parameters = {"num_questions": args.num_questions}
+                queue.enqueue(args.job_id, targets, batch_size=scheduler.batch_size, parameters=parameters)
+                results = QueueWorker(db, queue, scheduler, args.job_id).run()
+                for status, counts in sorted(queue.status(args.job_id).items()):
+                    logger.info(f"Job {args.job_id}: {counts['items']} {status} items, {counts['accepted']} accepted")
+            elif args.target is not None:
+                from refill_jobs import RefillJobStore, run_refill_job
+
+                store = RefillJobStore(args.state)
+                results = run_refill_job(db, scheduler, store, args.job_id, args.target, categories)
+                for progress in store.progress(args.job_id):
+                    logger.info(f"{progress['category_name']}: {progress['initial_count']} at start, "
+                                f"{progress['inserted']} inserted by this job, {progress['status']}")
+            else:
+                results = scheduler.run(categories, num_questions=args.num_questions)
+            total_questions = sum(results.values())
+        else:
+            for category in categories:
+                questions_added = generate_questions_for_category(
+                    db=db,
+                    category_id=category['id'],
+                    category_name=category['name'],
+                    category_name_ru=category['name_ru'],
+                    num_questions=args.num_questions,
+                    cache=cache,
+                    backend=backend,
+                    circuit_breaker=circuit_breaker,
+                    batch_sizer=batch_sizer
+                )
+                total_questions += questions_added
+                logger.info(f"Completed processing for {category['name']}")
+                logger.info("-" * 50)
         
         logger.info(f"Operation completed: Added {total_questions} questions across all categories!")
+        logger.info("Run summary:\n" + metrics.summary_table())
+        if batch_sizer is not None:
+            logger.info("Batch sizing:\n" + batch_sizer.summary_table())
+        if args.metrics_out:
+            metrics.write(args.metrics_out)
             
     except Exception as e:
         logger.error(f"An error occurred in main: {str(e)}", exc_info=True)
         raise
 
 if __name__ == "__main__":
+    # Configure logging
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
     main() 
\ No newline at end of file
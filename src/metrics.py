@@ -0,0 +1,174 @@
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+PREFIX = "quizgen"
+MAX_SAMPLES = 10000
+
+
+def _label_key(labels: Dict) -> Tuple:
+    return tuple(sorted((key, str(value)) for key, value in labels.items() if value is not None))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _percentile(ordered: List[float], pct: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+class Timing:
+    """Count/sum/max of a timed span plus a bounded reservoir for percentiles"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples: List[float] = []
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        if len(self.samples) < MAX_SAMPLES:
+            self.samples.append(seconds)
+        else:
+            index = random.randrange(self.count)
+            if index < MAX_SAMPLES:
+                self.samples[index] = seconds
+
+    def quantiles(self) -> Dict[str, float]:
+        ordered = sorted(self.samples)
+        return {q: _percentile(ordered, float(q) * 100) for q in ("0.5", "0.95", "0.99")}
+
+
+class MetricsRegistry:
+    """Thread-safe counters and timing spans for a generation run"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[Tuple[str, Tuple], float] = {}
+        self.timings: Dict[Tuple[str, Tuple], Timing] = {}
+        self.started_at = time.time()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters.clear()
+            self.timings.clear()
+            self.started_at = time.time()
+
+    def increment(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        key = (name, _label_key(labels))
+        with self._lock:
+            timing = self.timings.get(key)
+            if timing is None:
+                timing = self.timings[key] = Timing()
+            timing.observe(seconds)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Time the enclosed block as one span of `name`"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def counter_value(self, name: str, **labels) -> float:
+        """Sum of a counter over all label sets matching `labels`"""
+        wanted = set(_label_key(labels))
+        with self._lock:
+            return sum(value for (counter, key), value in self.counters.items()
+                       if counter == name and wanted <= set(key))
+
+    def to_prometheus(self) -> str:
+        """Render all metrics in the Prometheus text exposition format"""
+        def render_labels(key: Tuple, extra: Tuple = ()) -> str:
+            pairs = list(key) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self.counters}):
+                lines.append(f"# TYPE {PREFIX}_{name}_total counter")
+                for (counter, key), value in sorted(self.counters.items()):
+                    if counter == name:
+                        lines.append(f"{PREFIX}_{name}_total{render_labels(key)} {value:g}")
+            for name in sorted({name for name, _ in self.timings}):
+                lines.append(f"# TYPE {PREFIX}_{name}_seconds summary")
+                for (timing_name, key), timing in sorted(self.timings.items(), key=lambda item: item[0]):
+                    if timing_name != name:
+                        continue
+                    for quantile, value in timing.quantiles().items():
+                        lines.append(f"{PREFIX}_{name}_seconds{render_labels(key, (('quantile', quantile),))} {value:.6f}")
+                    lines.append(f"{PREFIX}_{name}_seconds_sum{render_labels(key)} {timing.total:.6f}")
+                    lines.append(f"{PREFIX}_{name}_seconds_count{render_labels(key)} {timing.count}")
+        return "\n".join(lines) + "\n"
+
+    def to_json_lines(self) -> str:
+        """Render one JSON object per metric series"""
+        lines = []
+        with self._lock:
+            for (name, key), value in sorted(self.counters.items()):
+                lines.append(json.dumps({"type": "counter", "name": name, "labels": dict(key), "value": value},
+                                        ensure_ascii=False))
+            for (name, key), timing in sorted(self.timings.items(), key=lambda item: item[0]):
+                lines.append(json.dumps({
+                    "type": "timing",
+                    "name": name,
+                    "labels": dict(key),
+                    "count": timing.count,
+                    "sum_s": round(timing.total, 6),
+                    "max_s": round(timing.max, 6),
+                    **{f"p{int(float(q) * 100)}_s": round(v, 6) for q, v in timing.quantiles().items()},
+                }, ensure_ascii=False))
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> None:
+        """Export to `path`: Prometheus text for *.prom, JSON lines otherwise"""
+        content = self.to_prometheus() if path.endswith(".prom") else self.to_json_lines()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+
+    def summary_table(self) -> str:
+        """Per-run summary aggregated over labels, one row per metric"""
+        counters: Dict[str, float] = {}
+        timings: Dict[str, Timing] = {}
+        with self._lock:
+            for (name, _), value in self.counters.items():
+                counters[name] = counters.get(name, 0) + value
+            for (name, _), timing in self.timings.items():
+                merged = timings.setdefault(name, Timing())
+                merged.count += timing.count
+                merged.total += timing.total
+                merged.max = max(merged.max, timing.max)
+                merged.samples.extend(timing.samples)
+
+        rows = [f"{'span':<24}{'count':>8}{'total s':>11}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}"]
+        for name, timing in sorted(timings.items()):
+            quantiles = timing.quantiles()
+            rows.append(f"{name:<24}{timing.count:>8}{timing.total:>11.3f}{quantiles['0.5'] * 1000:>10.1f}"
+                        f"{quantiles['0.95'] * 1000:>10.1f}{timing.max * 1000:>10.1f}")
+        rows.append("")
+        rows.append(f"{'counter':<24}{'value':>12}")
+        for name, value in sorted(counters.items()):
+            rows.append(f"{name:<24}{value:>12g}")
+        rows.append(f"{'wall_seconds':<24}{time.time() - self.started_at:>12.1f}")
+        return "\n".join(rows)
+
+
+# Process-wide registry used by the generation pipeline
+metrics = MetricsRegistry()
@@ -0,0 +1,149 @@
+import argparse
+import gzip
+import json
+import logging
+import sys
+from typing import Dict, Iterable, Iterator, List
+
+logger = logging.getLogger(__name__)
+
+# Fields of an exported question. `category_slug` lets an import map rows onto
+# the category ids of another environment; `id` is informational only.
+EXPORT_FIELDS = ("id", "category_id", "category_slug", "question", "correct_answer", "options", "difficulty", "score")
+
+JSONL = "jsonl"
+PARQUET = "parquet"
+JSON = "json"
+
+
+def detect_format(path: str) -> str:
+    """Dump format from the file name: *.jsonl[.gz], *.parquet or a legacy *.json array"""
+    name = path[:-3] if path.endswith(".gz") else path
+    if name.endswith(".jsonl"):
+        return JSONL
+    if name.endswith(".parquet"):
+        return PARQUET
+    if name.endswith(".json"):
+        return JSON
+    raise ValueError(f"Unknown question dump format: {path} (use .jsonl, .jsonl.gz or .parquet)")
+
+
+def open_text(path: str, mode: str):
+    """Open a text file for `mode` "r" or "w", gzip-compressed when the name ends with .gz"""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def open_binary(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "b")
+    return open(path, mode + "b")
+
+
+def _chunked(records: Iterable[Dict], chunk_size: int) -> Iterator[List[Dict]]:
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _parquet_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ("id", pa.int64()),
+        ("category_id", pa.int64()),
+        ("category_slug", pa.string()),
+        ("question", pa.string()),
+        ("correct_answer", pa.string()),
+        ("options", pa.list_(pa.string())),
+        ("difficulty", pa.string()),
+        ("score", pa.int32()),
+    ])
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet dumps need pyarrow: pip install pyarrow")
+    return pq
+
+
+def read_chunks(path: str, chunk_size: int = 5000) -> Iterator[List[Dict]]:
+    """Read question records from a dump in chunks of at most `chunk_size`"""
+    dump_format = detect_format(path)
+    if dump_format == JSONL:
+        with open_text(path, "r") as f:
+            yield from _chunked((json.loads(line) for line in f if line.strip()), chunk_size)
+    elif dump_format == PARQUET:
+        pq = _import_pyarrow()
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pylist()
+    else:
+        # Legacy array dumps such as quiz_questions.json have to be loaded whole
+        with open_text(path, "r") as f:
+            yield from _chunked(json.load(f), chunk_size)
+
+
+def write_chunks(path: str, chunks: Iterable[List[Dict]]) -> int:
+    """Write chunks of question records to a JSONL or Parquet dump, return the record count"""
+    dump_format = detect_format(path)
+    count = 0
+    if dump_format == JSONL:
+        with open_text(path, "w") as f:
+            for chunk in chunks:
+                f.writelines(json.dumps(record, ensure_ascii=False) + "\n" for record in chunk)
+                count += len(chunk)
+    elif dump_format == PARQUET:
+        pq = _import_pyarrow()
+        import pyarrow as pa
+
+        schema = _parquet_schema()
+        with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+            for chunk in chunks:
+                writer.write_batch(pa.RecordBatch.from_pylist(chunk, schema=schema))
+                count += len(chunk)
+    else:
+        raise ValueError("Exports are written as .jsonl, .jsonl.gz or .parquet")
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or import the quiz_questions table")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Dump quiz_questions to a file")
+    export_parser.add_argument("path", help="Output file: .jsonl, .jsonl.gz or .parquet")
+    export_parser.add_argument("--category", help="Only export this category slug")
+    import_parser = subparsers.add_parser("import", help="Load questions from a dump")
+    import_parser.add_argument("path", help="Input file: .jsonl, .jsonl.gz, .parquet or a legacy .json array")
+    for subparser in (export_parser, import_parser):
+        subparser.add_argument("--chunk-size", type=int, default=5000)
+        subparser.add_argument("--database-url", default=None)
+    args = parser.parse_args()
+
+    from database import Database
+
+    db = Database(args.database_url)
+    if args.command == "export":
+        category_id = None
+        if args.category:
+            category = db.get_category_by_slug(args.category)
+            if category is None:
+                print(f"Unknown category: {args.category}", file=sys.stderr)
+                sys.exit(1)
+            category_id = category["id"]
+        db.export_questions(args.path, chunk_size=args.chunk_size, category_id=category_id)
+    else:
+        result = db.import_questions(args.path, chunk_size=args.chunk_size)
+        logger.info(f"Imported {result['imported']} questions from {args.path}, skipped {result['skipped']}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -1,22 +1,25 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.chains import LLMChain
-from langchain.prompts import PromptTemplate
-import json
-import os
+import functools
+import logging
 import random
-import re
+import threading
+import time
+from typing import Dict, Optional
 
-class QuestionGenerator:
-    def __init__(self, category_name="Java Basics", category_name_ru="Основы Java"):
-        self.category_name = category_name
-        self.category_name_ru = category_name_ru
-        self.prompt_template = f"""
+from context_selection import CHARS_PER_TOKEN, ContextSelector, estimate_tokens
+from llm_backends import LLMBackend, shared_backend
+from metrics import metrics
+from response_cache import cache_key
+from response_parser import ResponseParser, clean_question_text, clean_option_text
+
+logger = logging.getLogger(__name__)
+
+PROMPT_TEMPLATE = """
         You are a Java programming expert and educator. Your task is to generate questions about {category_name} ({category_name_ru}).
         Based on these existing questions:
 
-        {{existing_questions}}
+        {existing_questions}
 
-        Generate {{num_questions}} new, unique, and educational questions about {category_name}. Focus on:
+        Generate {num_questions} new, unique, and educational questions about {category_name}. Focus on:
         1. Core concepts and fundamentals
         2. Best practices and common patterns
         3. Common mistakes and pitfalls
@@ -54,112 +57,168 @@ class QuestionGenerator:
         8. The correct answer (ANSWER) must be exactly the same as the first option in OPTIONS
         9. Do not include answer options or "ANSWER:" text within the question itself
         """
-        
-        self.prompt = PromptTemplate(
-            input_variables=["existing_questions", "num_questions"],
-            template=self.prompt_template
-        )
-        
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-pro",
-            temperature=0.7,
-            google_api_key=os.getenv("GOOGLE_API_KEY")
+
+
+@functools.lru_cache(maxsize=None)
+def category_prompt(category_name: str, category_name_ru: str) -> str:
+    """Prompt with the category filled in, built once per category and shared by all its generators.
+
+    The result still has {existing_questions} and {num_questions} placeholders
+    for str.format, so building prompts needs no LLM client library.
+    """
+    return PROMPT_TEMPLATE.format(
+        category_name=category_name,
+        category_name_ru=category_name_ru,
+        existing_questions="{existing_questions}",
+        num_questions="{num_questions}"
+    )
+
+class QuestionGenerator:
+    def __init__(self, category_name="Java Basics", category_name_ru="Основы Java", context_token_budget=1500,
+                 backend: LLMBackend = None, cache=None):
+        self.category_name = category_name
+        self.category_name_ru = category_name_ru
+        self.backend = backend if backend is not None else shared_backend("google")
+        self.cache = cache
+        self.context_selector = ContextSelector(token_budget=context_token_budget)
+        self._local = threading.local()
+        self.prompt_template = category_prompt(category_name, category_name_ru)
+
+    def for_category(self, category_name, category_name_ru) -> "QuestionGenerator":
+        """Cheap per-category view sharing this generator's backend client and response cache"""
+        return QuestionGenerator(
+            category_name,
+            category_name_ru,
+            context_token_budget=self.context_selector.token_budget,
+            backend=self.backend,
+            cache=self.cache
         )
-        self.question_chain = self.prompt | self.llm
-    
+
+    @property
+    def last_call(self) -> Optional[Dict]:
+        """Token and parse counts of this thread's most recent generation call.
+
+        `complete` is False while the response is still streaming and when the
+        backend failed part-way through it.
+        """
+        return getattr(self._local, "last_call", None)
+
     def clean_question_text(self, text: str) -> str:
         """Clean the question text by removing answer options and answer labels"""
-        # Remove everything after "ОТВЕТ:" or "ANSWER:"
-        text = re.split(r'\n?(?:ОТВЕТ:|ANSWER:)', text)[0]
-        
-        # Remove OPTIONS section if present
-        text = re.split(r'\n?OPTIONS:', text)[0]
-        
-        # Remove numbered options (1., 2., 3., 4.)
-        text = re.sub(r'\n?\d+\. .*', '', text)
-        
-        # Remove any trailing whitespace or newlines
-        return text.strip()
+        return clean_question_text(text)
 
     def clean_option_text(self, text: str) -> str:
         """Clean the option text by removing answer labels and other artifacts"""
-        # Remove "(Answer: ...)" patterns
-        text = re.sub(r'\(Answer:.*?\)', '', text)
+        return clean_option_text(text)
+
+    def shuffle_options(self, question: dict) -> dict:
+        """Place the correct answer (always parsed as the first option) at a random position"""
+        options = question['options']
+        correct_answer = options[0]
         
-        # Remove "Answer:" text
-        text = text.replace('Answer:', '').replace('ANSWER:', '')
+        # Randomly choose position for correct answer
+        correct_position = random.randint(0, len(options) - 1)
         
-        # Remove any trailing whitespace or newlines
-        return text.strip()
-
-    def generate_questions(self, existing_questions, num_questions=5):
-        # Format existing questions for the prompt
-        questions_text = "\n".join([
-            f"- {q['question']} (Answer: {q['correct_answer']})" 
-            for q in existing_questions
-        ])
+        # Rearrange options with correct answer in random position
+        shuffled_options = options[1:]
+        random.shuffle(shuffled_options)
         
-        # Generate new questions
-        response = self.question_chain.invoke({
+        final_options = shuffled_options[:correct_position] + [correct_answer] + shuffled_options[correct_position:]
+        return {**question, 'correct_answer': correct_answer, 'options': final_options}
+
+    def _log_parse_errors(self, parser: ResponseParser) -> None:
+        for error in parser.errors:
+            logger.warning(f"Error parsing question block {error['block']} (line {error['line']}): {error['error']}")
+
+    def generate_questions_stream(self, existing_questions, num_questions=5, total_questions=None):
+        """Yield each question as soon as its "===" terminator arrives from the LLM.
+
+        Questions yielded before a mid-stream failure stay valid; the error is
+        re-raised after them.
+        """
+        # Format a bounded digest of existing questions for the prompt
+        questions_text = self.context_selector.build_digest(existing_questions, total_questions)
+        inputs = {
             "existing_questions": questions_text,
             "num_questions": num_questions
-        })
+        }
         
-        response_text = response.content
-        questions = []
-        question_blocks = response_text.strip().split('===')
+        prompt = self.prompt_template.format(**inputs)
+        labels = {"category": self.category_name}
+        prompt_tokens = estimate_tokens(prompt)
+        metrics.increment("prompt_chars", len(prompt), **labels)
+        metrics.increment("prompt_tokens", prompt_tokens, **labels)
+        self._local.last_call = {"prompt_tokens": prompt_tokens, "response_tokens": 0, "parsed": 0, "cached": False,
+                                 "complete": False}
+        
+        key = None
+        if self.cache is not None:
+            key = cache_key(self.backend.model, self.backend.temperature, prompt)
+            cached = self.cache.get(key)
+            if cached is not None:
+                logger.info(f"Serving {self.category_name} batch from response cache")
+                metrics.increment("cache_hits", **labels)
+                self._local.last_call.update(parsed=len(cached["parsed"]), cached=True, complete=True)
+                for question in cached["parsed"]:
+                    yield self.shuffle_options(question)
+                return
         
-        for block in question_blocks:
-            if not block.strip():
-                continue
-                
+        parser = ResponseParser()
+        raw_chunks = []
+        parsed = []
+        llm_seconds = parse_seconds = 0.0
+        chunks = iter(self.backend.stream(prompt))
+        try:
+            while True:
+                # Time spent waiting on the backend vs. parsing, excluding the consumer
+                started = time.perf_counter()
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    break
+                finally:
+                    llm_seconds += time.perf_counter() - started
+                raw_chunks.append(chunk)
+                started = time.perf_counter()
+                completed = parser.feed(chunk)
+                parse_seconds += time.perf_counter() - started
+                for question in completed:
+                    parsed.append(question)
+                    yield self.shuffle_options(question)
+            started = time.perf_counter()
+            completed = parser.close()
+            parse_seconds += time.perf_counter() - started
+            for question in completed:
+                parsed.append(question)
+                yield self.shuffle_options(question)
+            self._local.last_call["complete"] = True
+        except GeneratorExit:
+            # The consumer has all the questions it wanted; nothing was cut off
+            self._local.last_call["complete"] = True
+            raise
+        finally:
+            self._log_parse_errors(parser)
+            response_chars = sum(len(chunk) for chunk in raw_chunks)
+            metrics.observe("llm", llm_seconds, **labels)
+            metrics.observe("parse", parse_seconds, **labels)
+            metrics.increment("response_chars", response_chars, **labels)
+            metrics.increment("response_tokens", response_chars // CHARS_PER_TOKEN, **labels)
+            metrics.increment("questions_parsed", len(parsed), **labels)
+            metrics.increment("parse_errors", len(parser.errors), **labels)
+            self._local.last_call.update(response_tokens=response_chars // CHARS_PER_TOKEN, parsed=len(parsed))
+        
+        # Only complete responses are cached
+        if key is not None:
+            self.cache.put(key, self.backend.model, "".join(raw_chunks), parsed)
+
+    def generate_questions(self, existing_questions, num_questions=5, total_questions=None):
+        questions = []
+        with metrics.timer("generate_questions", category=self.category_name):
             try:
-                # Extract and clean question
-                question = block[block.find('QUESTION:') + 9:block.find('ANSWER:')].strip()
-                question = self.clean_question_text(question)
-                
-                # Extract and clean answer
-                answer = block[block.find('ANSWER:') + 7:block.find('DIFFICULTY:')].strip()
-                answer = self.clean_option_text(answer)
-                
-                # Extract difficulty
-                difficulty = block[block.find('DIFFICULTY:') + 11:block.find('SCORE:')].strip()
-                
-                # Extract score
-                score_text = block[block.find('SCORE:') + 6:block.find('OPTIONS:')].strip()
-                score = int(score_text) if score_text.isdigit() else 5
-                
-                # Extract and clean options
-                options_text = block[block.find('OPTIONS:'):].strip()
-                options = []
-                for line in options_text.split('\n')[1:]:
-                    if line.strip() and '. ' in line:
-                        option = line.split('. ', 1)[1].strip()
-                        option = self.clean_option_text(option)
-                        options.append(option)
-                
-                if len(options) == 4:
-                    # Use the first option as the correct answer to ensure consistency
-                    correct_answer = options[0]
-                    
-                    # Randomly choose position for correct answer
-                    correct_position = random.randint(0, 3)
-                    
-                    # Rearrange options with correct answer in random position
-                    shuffled_options = options[1:]
-                    random.shuffle(shuffled_options)
-                    
-                    final_options = shuffled_options[:correct_position] + [correct_answer] + shuffled_options[correct_position:]
-                    
-                    questions.append({
-                        'question': question,
-                        'correct_answer': correct_answer,
-                        'options': final_options,
-                        'difficulty': difficulty.lower(),
-                        'score': score
-                    })
+                for question in self.generate_questions_stream(existing_questions, num_questions, total_questions):
+                    questions.append(question)
             except Exception as e:
-                print(f"Error parsing question block: {e}")
-                continue
-        
-        return questions 
\ No newline at end of file
+                if not questions:
+                    raise
+                logger.warning(f"Generation failed after {len(questions)} questions, keeping them: {e}")
+        return questions
@@ -0,0 +1,110 @@
+import logging
+import random
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+SERVING_COLUMNS = ("id", "question", "correct_answer", "options", "difficulty", "score")
+
+
+class QuestionPool:
+    """All questions of one category, indexed by difficulty for random draws"""
+
+    def __init__(self, questions: List[Dict]):
+        self.loaded_at = time.monotonic()
+        self.questions = questions
+        self.by_difficulty: Dict[str, List[Dict]] = {}
+        for question in questions:
+            self.by_difficulty.setdefault(question["difficulty"], []).append(question)
+
+    def draw(self, count: int, difficulty: Optional[str], rng: random.Random) -> List[Dict]:
+        candidates = self.questions if difficulty is None else self.by_difficulty.get(difficulty, [])
+        return rng.sample(candidates, min(count, len(candidates)))
+
+
+class QuizService:
+    """Read path for serving quizzes from an in-process cache of per-category question pools.
+
+    A pool is loaded with one streaming query the first time its category is
+    requested and then serves every quiz start from memory until it expires
+    (`ttl_seconds`) or questions of the category are written through `db`.
+    Draws are random.sample over the cached list, i.e. O(count) instead of an
+    ORDER BY random() scan.
+    """
+
+    def __init__(self, db, ttl_seconds: float = 300.0, seed: Optional[int] = None):
+        self.db = db
+        self.ttl_seconds = ttl_seconds
+        self._pools: Dict[int, QuestionPool] = {}
+        self._load_locks: Dict[int, threading.Lock] = {}
+        # Bumped by every invalidation, so a load that overlapped one is not cached
+        self._generations: Dict[int, int] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        db.write_listeners.append(self.invalidate)
+
+    def invalidate(self, category_id: Optional[int] = None) -> None:
+        """Drop the cached pool of a category, or of every category when None"""
+        with self._lock:
+            if category_id is None:
+                self._pools.clear()
+                self._generation += 1
+            else:
+                self._pools.pop(category_id, None)
+                self._generations[category_id] = self._generations.get(category_id, 0) + 1
+
+    def _current_generation(self, category_id: int) -> Tuple[int, int]:
+        return self._generation, self._generations.get(category_id, 0)
+
+    def _cached(self, category_id: int) -> Optional[QuestionPool]:
+        with self._lock:
+            pool = self._pools.get(category_id)
+        if pool is not None and time.monotonic() - pool.loaded_at < self.ttl_seconds:
+            return pool
+        return None
+
+    def pool(self, category_id: int) -> QuestionPool:
+        pool = self._cached(category_id)
+        if pool is not None:
+            metrics.increment("quiz_pool_hits")
+            return pool
+        with self._lock:
+            load_lock = self._load_locks.setdefault(category_id, threading.Lock())
+        # One loader per category; concurrent quiz starts wait for it instead of querying too
+        with load_lock:
+            pool = self._cached(category_id)
+            if pool is not None:
+                metrics.increment("quiz_pool_hits")
+                return pool
+            with self._lock:
+                generation = self._current_generation(category_id)
+            with metrics.timer("quiz_pool_load"):
+                pool = QuestionPool(list(self.db.iter_questions(category_id, columns=SERVING_COLUMNS)))
+            metrics.increment("quiz_pool_misses")
+            logger.info(f"Loaded {len(pool.questions)} questions for category {category_id} into the quiz cache")
+            with self._lock:
+                if self._current_generation(category_id) == generation:
+                    self._pools[category_id] = pool
+                else:
+                    # Questions were written during the load: serve this snapshot once, reload next time
+                    metrics.increment("quiz_pool_stale_loads")
+            return pool
+
+    def draw(self, category_id: int, count: int = 10, difficulty: Optional[str] = None) -> List[Dict]:
+        """Up to `count` distinct random questions of a category, optionally of one difficulty"""
+        pool = self.pool(category_id)
+        with self._lock:
+            rng = random.Random(self._random.getrandbits(64))
+        return [dict(question, options=list(question["options"])) for question in pool.draw(count, difficulty, rng)]
+
+    def draw_mix(self, category_id: int, counts: Dict[str, int]) -> List[Dict]:
+        """Draw e.g. {"easy": 5, "medium": 3, "hard": 2} questions, in that order"""
+        questions = []
+        for difficulty, count in counts.items():
+            questions.extend(self.draw(category_id, count, difficulty))
+        return questions
@@ -0,0 +1,322 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+
+
+class RefillJobStore:
+    """Local SQLite checkpoint table for resumable refill jobs"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript("""
+            CREATE TABLE IF NOT EXISTS refill_jobs (
+                job_id TEXT PRIMARY KEY,
+                target INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS refill_progress (
+                job_id TEXT NOT NULL REFERENCES refill_jobs (job_id),
+                category_id INTEGER NOT NULL,
+                category_name TEXT NOT NULL,
+                initial_count INTEGER NOT NULL,
+                inserted INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (job_id, category_id)
+            );
+            -- LLM responses whose questions may not be stored yet, replayed on resume
+            CREATE TABLE IF NOT EXISTS refill_batches (
+                batch_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_id TEXT NOT NULL REFERENCES refill_jobs (job_id),
+                category_id INTEGER NOT NULL,
+                questions TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+        """)
+        self._connection.commit()
+
+    def start(self, job_id: str, target: int) -> bool:
+        """Create the job or resume it; returns True when an existing job is resumed"""
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT target, status FROM refill_jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            if row is not None:
+                if row[0] != target:
+                    raise ValueError(f"Refill job {job_id} was started with target {row[0]}, not {target}")
+                self._connection.execute(
+                    "UPDATE refill_jobs SET status = ?, updated_at = ? WHERE job_id = ?", (RUNNING, now, job_id)
+                )
+            else:
+                self._connection.execute(
+                    "INSERT INTO refill_jobs (job_id, target, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    (job_id, target, RUNNING, now, now)
+                )
+            self._connection.commit()
+            return row is not None
+
+    def reconcile(self, job_id: str, categories: List[Dict], counts: Dict[int, int], target: int) -> None:
+        """Record the current count of every category and mark the ones that reached the target"""
+        now = time.time()
+        with self._lock:
+            for category in categories:
+                count = counts.get(category["id"], 0)
+                status = DONE if count >= target else PENDING
+                self._connection.execute(
+                    """
+                    INSERT INTO refill_progress
+                    (job_id, category_id, category_name, initial_count, inserted, status, updated_at)
+                    VALUES (?, ?, ?, ?, 0, ?, ?)
+                    ON CONFLICT (job_id, category_id) DO UPDATE SET status = excluded.status,
+                        updated_at = excluded.updated_at
+                    """,
+                    (job_id, category["id"], category["name"], count, status, now)
+                )
+            self._connection.commit()
+
+    def record_progress(self, job_id: str, category_id: int, inserted: int) -> None:
+        """Checkpoint questions committed to the database for a category"""
+        with self._lock:
+            self._connection.execute(
+                """
+                UPDATE refill_progress SET inserted = inserted + ?, updated_at = ?
+                WHERE job_id = ? AND category_id = ?
+                """,
+                (inserted, time.time(), job_id, category_id)
+            )
+            self._connection.commit()
+
+    def checkpoint_batch(self, job_id: str, category_id: int, questions: List[Dict],
+                         batch_id: Optional[int] = None) -> int:
+        """Save a batch's questions before they are inserted (or update a streaming batch), return its id"""
+        encoded = json.dumps(questions, ensure_ascii=False)
+        with self._lock:
+            if batch_id is None:
+                batch_id = self._connection.execute(
+                    "INSERT INTO refill_batches (job_id, category_id, questions, created_at) VALUES (?, ?, ?, ?)",
+                    (job_id, category_id, encoded, time.time())
+                ).lastrowid
+            else:
+                self._connection.execute(
+                    "UPDATE refill_batches SET questions = ? WHERE batch_id = ?", (encoded, batch_id)
+                )
+            self._connection.commit()
+            return batch_id
+
+    def clear_batch(self, batch_id: int) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM refill_batches WHERE batch_id = ?", (batch_id,))
+            self._connection.commit()
+
+    def pending_batches(self, job_id: str) -> Dict[int, List[Tuple[int, List[Dict]]]]:
+        """Checkpointed batches of a job that were not cleared, by category id"""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT batch_id, category_id, questions FROM refill_batches WHERE job_id = ? ORDER BY batch_id",
+                (job_id,)
+            ).fetchall()
+        batches: Dict[int, List[Tuple[int, List[Dict]]]] = {}
+        for batch_id, category_id, questions in rows:
+            batches.setdefault(category_id, []).append((batch_id, json.loads(questions)))
+        return batches
+
+    def finish(self, job_id: str, complete: bool) -> None:
+        with self._lock:
+            self._connection.execute(
+                "UPDATE refill_jobs SET status = ?, updated_at = ? WHERE job_id = ?",
+                (DONE if complete else PENDING, time.time(), job_id)
+            )
+            if complete:
+                self._connection.execute("DELETE FROM refill_batches WHERE job_id = ?", (job_id,))
+            self._connection.commit()
+
+    def progress(self, job_id: str) -> List[Dict]:
+        with self._lock:
+            rows = self._connection.execute(
+                """
+                SELECT category_id, category_name, initial_count, inserted, status
+                FROM refill_progress WHERE job_id = ? ORDER BY category_id
+                """,
+                (job_id,)
+            ).fetchall()
+        return [
+            {
+                "category_id": row[0],
+                "category_name": row[1],
+                "initial_count": row[2],
+                "inserted": row[3],
+                "status": row[4]
+            } for row in rows
+        ]
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+class CheckpointedGenerator:
+    """Wraps a category's generator so every LLM response is checkpointed before it is stored.
+
+    A batch's checkpoint is cleared once the scheduler has stored it. Batches
+    still checkpointed when a job resumes were in flight during the crash;
+    they are served again from the state file before any new LLM call, and
+    the duplicate index drops whatever part of them was already committed.
+    """
+
+    def __init__(self, generator, store: RefillJobStore, job_id: str, category_id: int,
+                 replay: Optional[List[Tuple[int, List[Dict]]]] = None):
+        self.generator = generator
+        self.store = store
+        self.job_id = job_id
+        self.category_id = category_id
+        self.replay = list(replay or [])
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def __getattr__(self, name):
+        return getattr(self.generator, name)
+
+    @property
+    def last_call(self) -> Optional[Dict]:
+        if getattr(self._local, "replayed", False):
+            # Nothing was asked of the LLM; the batch sizer skips cached calls
+            return {"cached": True, "complete": True}
+        return self.generator.last_call
+
+    def _next_replay(self) -> Optional[Tuple[int, List[Dict]]]:
+        with self._lock:
+            return self.replay.pop(0) if self.replay else None
+
+    def generate_questions(self, existing_questions, num_questions=5, total_questions=None):
+        replay = self._next_replay()
+        self._local.replayed = replay is not None
+        if replay is not None:
+            self._local.batch_id, questions = replay
+            logger.info(f"Replaying {len(questions)} checkpointed questions instead of calling the LLM")
+            metrics.increment("refill_replayed_batches")
+            return questions
+        self._local.batch_id = None
+        questions = self.generator.generate_questions(existing_questions, num_questions, total_questions)
+        if questions:
+            self._local.batch_id = self.store.checkpoint_batch(self.job_id, self.category_id, questions)
+        return questions
+
+    def generate_questions_stream(self, existing_questions, num_questions=5, total_questions=None):
+        replay = self._next_replay()
+        self._local.replayed = replay is not None
+        if replay is not None:
+            self._local.batch_id, questions = replay
+            logger.info(f"Replaying {len(questions)} checkpointed questions instead of calling the LLM")
+            metrics.increment("refill_replayed_batches")
+            yield from questions
+            return
+        self._local.batch_id = None
+        questions = []
+        for question in self.generator.generate_questions_stream(existing_questions, num_questions,
+                                                                 total_questions):
+            questions.append(question)
+            # Checkpointed before the scheduler can insert it
+            self._local.batch_id = self.store.checkpoint_batch(self.job_id, self.category_id, questions,
+                                                               self._local.batch_id)
+            yield question
+
+    def batch_done(self) -> None:
+        """Called on the batch's thread after its questions were stored"""
+        batch_id = getattr(self._local, "batch_id", None)
+        if batch_id is not None:
+            self.store.clear_batch(batch_id)
+            self._local.batch_id = None
+
+
+def compute_deficits(categories: List[Dict], counts: Dict[int, int], target: int) -> Dict[int, int]:
+    """Questions still missing per category to reach `target`"""
+    return {category["id"]: max(0, target - counts.get(category["id"], 0)) for category in categories}
+
+
+def run_refill_job(db, scheduler, store: RefillJobStore, job_id: str, target: int,
+                   categories: Optional[List[Dict]] = None) -> Dict[int, int]:
+    """Top every category up to `target` questions, resuming `job_id` if it was interrupted.
+
+    Deficits are always recomputed from the database (one GROUP BY query), so
+    questions committed before a crash are never generated twice and a
+    resumed run cannot overshoot the target. Every LLM response is
+    checkpointed in the state file before its questions are inserted, so the
+    batch that was in flight during a crash is replayed on resume instead of
+    being requested from the LLM again.
+    """
+    resumed = store.start(job_id, target)
+    categories = categories if categories is not None else db.get_categories()
+    counts = db.count_questions_by_category()
+    store.reconcile(job_id, categories, counts, target)
+
+    deficits = compute_deficits(categories, counts, target)
+    pending = [category for category in categories if deficits[category["id"]] > 0]
+    logger.info(f"{'Resuming' if resumed else 'Starting'} refill job {job_id}: target {target}, "
+                f"{len(pending)}/{len(categories)} categories below target, "
+                f"{sum(deficits.values())} questions missing")
+    metrics.increment("refill_deficit", sum(deficits.values()))
+
+    replay = store.pending_batches(job_id)
+    if replay:
+        logger.info(f"Replaying {sum(len(batches) for batches in replay.values())} checkpointed batches "
+                    f"of refill job {job_id}")
+    by_name = {category["name"]: category for category in categories}
+    generators: Dict[int, CheckpointedGenerator] = {}
+    previous_factory = scheduler.generator_factory
+    previous_callback = scheduler.on_stored
+    previous_batch_done = scheduler.on_batch_done
+
+    def generator_factory(category_name: str, category_name_ru: str):
+        generator = previous_factory(category_name, category_name_ru)
+        category = by_name.get(category_name)
+        if category is None:
+            return generator
+        generators[category["id"]] = CheckpointedGenerator(generator, store, job_id, category["id"],
+                                                           replay.get(category["id"]))
+        return generators[category["id"]]
+
+    def on_stored(category: Dict, stored: int) -> None:
+        store.record_progress(job_id, category["id"], stored)
+        if previous_callback is not None:
+            previous_callback(category, stored)
+
+    def on_batch_done(category: Dict) -> None:
+        generator = generators.get(category["id"])
+        if generator is not None:
+            generator.batch_done()
+        if previous_batch_done is not None:
+            previous_batch_done(category)
+
+    scheduler.generator_factory = generator_factory
+    scheduler.on_stored = on_stored
+    scheduler.on_batch_done = on_batch_done
+    try:
+        results = scheduler.run(pending, targets=deficits) if pending else {}
+    finally:
+        scheduler.generator_factory = previous_factory
+        scheduler.on_stored = previous_callback
+        scheduler.on_batch_done = previous_batch_done
+
+    counts = db.count_questions_by_category()
+    store.reconcile(job_id, categories, counts, target)
+    complete = all(counts.get(category["id"], 0) >= target for category in categories)
+    store.finish(job_id, complete)
+    logger.info(f"Refill job {job_id} {'completed' if complete else 'incomplete, rerun to resume'}")
+    return results
@@ -0,0 +1,102 @@
+import argparse
+import json
+import logging
+from typing import Dict, List, Optional
+
+from response_parser import EXPECTED_OPTIONS, clean_option_text, clean_question_text, has_leaked_labels
+
+logger = logging.getLogger(__name__)
+
+REPAIR_COLUMNS = ("id", "question", "correct_answer", "options")
+MAX_SAMPLES = 5
+
+
+def repair_question(row: Dict) -> Optional[Dict]:
+    """Cleaned version of a stored question, or None when it is already clean.
+
+    Uses the same cleaning as the generator, so a repaired row looks exactly
+    like a freshly generated one. Question text is only rewritten when it has
+    leaked labels; clean text may legitimately contain "8. " or numbered
+    lists. The result carries a `problem` key when the row cannot be salvaged
+    and should be regenerated instead.
+    """
+    question = row["question"]
+    if has_leaked_labels(question):
+        question = clean_question_text(question)
+    correct_answer = clean_option_text(row["correct_answer"])
+    options = [clean_option_text(option) for option in row["options"]]
+    fixed = {"id": row["id"], "question": question, "correct_answer": correct_answer, "options": options}
+
+    if not question:
+        fixed["problem"] = "empty question after cleaning"
+    elif len(options) != EXPECTED_OPTIONS or not all(options):
+        fixed["problem"] = f"expected {EXPECTED_OPTIONS} non-empty options, got {len([o for o in options if o])}"
+    elif correct_answer not in options:
+        fixed["problem"] = "correct answer is not one of the options"
+    elif (question == row["question"] and correct_answer == row["correct_answer"]
+          and options == list(row["options"])):
+        return None
+    return fixed
+
+
+def repair_category(db, category: Dict, apply: bool = False, chunk_size: int = 1000) -> Dict:
+    """Scan one category in keyset-paginated chunks and fix what can be fixed.
+
+    With apply=False (dry run) nothing is written. Unsalvageable rows are only
+    reported, never modified.
+    """
+    report = {"scanned": 0, "repaired": 0, "unrepairable": [], "samples": []}
+    after_id = 0
+    while True:
+        page = db.get_questions_page(category["id"], after_id=after_id, limit=chunk_size, columns=REPAIR_COLUMNS)
+        if not page:
+            break
+        after_id = page[-1]["id"]
+        report["scanned"] += len(page)
+
+        updates: List[Dict] = []
+        for row in page:
+            fixed = repair_question(row)
+            if fixed is None:
+                continue
+            if "problem" in fixed:
+                report["unrepairable"].append({"id": row["id"], "problem": fixed["problem"]})
+                continue
+            updates.append(fixed)
+            if len(report["samples"]) < MAX_SAMPLES:
+                report["samples"].append({"id": row["id"], "before": row["question"], "after": fixed["question"]})
+
+        if apply and updates:
+            db.update_questions(updates)
+        report["repaired"] += len(updates)
+    return report
+
+
+def repair_questions(db, apply: bool = False, chunk_size: int = 1000) -> Dict[int, Dict]:
+    """Run the repair pass over every category, returning a report per category id"""
+    reports = {}
+    for category in db.get_categories():
+        report = repair_category(db, category, apply=apply, chunk_size=chunk_size)
+        logger.info(f"{category['name']}: {report['scanned']} scanned, "
+                    f"{report['repaired']} {'repaired' if apply else 'repairable'}, "
+                    f"{len(report['unrepairable'])} unrepairable")
+        reports[category["id"]] = report
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Clean leaked labels and options out of stored questions")
+    parser.add_argument("--apply", action="store_true", help="Write the fixes (default: dry-run report only)")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    from database import Database
+
+    reports = repair_questions(Database(), apply=args.apply, chunk_size=args.chunk_size)
+    for category_id, report in reports.items():
+        print(json.dumps({"category_id": category_id, **report}, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(model: str, temperature: float, prompt: str) -> str:
+    """Content address of an LLM call"""
+    digest = hashlib.sha256()
+    digest.update(f"{model}\0{temperature!r}\0".encode("utf-8"))
+    digest.update(prompt.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """On-disk SQLite cache of raw LLM responses and their parsed questions.
+
+    Entries are keyed by model, temperature and the rendered prompt. The same
+    prompt can legitimately be sent several times in one run (e.g. two batches
+    of a category starting from the same context), so each key holds a list of
+    slots: within one process every lookup is served the next unused slot, and
+    a miss appends a new one. A rerun therefore replays the previous run's
+    responses in the same order.
+    """
+
+    def __init__(self, path: str, ttl_seconds: Optional[float] = 7 * 24 * 3600, max_entries: int = 10000):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._served: Dict[str, int] = defaultdict(int)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS llm_responses (
+                key TEXT NOT NULL,
+                slot INTEGER NOT NULL,
+                model TEXT NOT NULL,
+                raw TEXT NOT NULL,
+                parsed TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (key, slot)
+            )
+        """)
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS llm_responses_last_used ON llm_responses (last_used)"
+        )
+        self._connection.commit()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return the next unserved {"raw", "parsed"} entry for `key`, or None on a miss"""
+        with self._lock:
+            slot = self._served[key]
+            row = self._connection.execute(
+                "SELECT raw, parsed, created_at FROM llm_responses WHERE key = ? AND slot = ?",
+                (key, slot)
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if self.ttl_seconds is not None and row[2] < now - self.ttl_seconds:
+                self._connection.execute("DELETE FROM llm_responses WHERE key = ? AND slot >= ?", (key, slot))
+                self._connection.commit()
+                return None
+            self._served[key] = slot + 1
+            self._connection.execute(
+                "UPDATE llm_responses SET last_used = ? WHERE key = ? AND slot = ?", (now, key, slot)
+            )
+            self._connection.commit()
+            return {"raw": row[0], "parsed": json.loads(row[1])}
+
+    def put(self, key: str, model: str, raw: str, parsed: List[Dict]) -> None:
+        """Store a complete response in the next slot of `key`"""
+        try:
+            with self._lock:
+                slot = self._served[key]
+                now = time.time()
+                self._connection.execute(
+                    """
+                    INSERT OR REPLACE INTO llm_responses (key, slot, model, raw, parsed, created_at, last_used)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (key, slot, model, raw, json.dumps(parsed, ensure_ascii=False), now, now)
+                )
+                self._served[key] = slot + 1
+                self._evict(now)
+                self._connection.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Error writing response cache {self.path}: {e}")
+
+    def _evict(self, now: float) -> None:
+        if self.ttl_seconds is not None:
+            self._connection.execute(
+                "DELETE FROM llm_responses WHERE created_at < ?", (now - self.ttl_seconds,)
+            )
+        if self.max_entries:
+            self._connection.execute(
+                """
+                DELETE FROM llm_responses WHERE rowid IN (
+                    SELECT rowid FROM llm_responses ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,)
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,225 @@
+import re
+from typing import Dict, List, Optional, Tuple, TypedDict
+
+# Field labels, optionally decorated with markdown (e.g. "**QUESTION:**")
+_LABEL_RE = re.compile(
+    r'^[\s*#>-]*(QUESTION|ВОПРОС|ANSWER|ОТВЕТ|DIFFICULTY|СЛОЖНОСТЬ|SCORE|OPTIONS|ВАРИАНТЫ)\**\s*:\**\s*(.*)$'
+)
+_OPTION_RE = re.compile(r'^\s*(\d+)[.)]\s+(.*)$')
+_SEPARATOR_RE = re.compile(r'^(.*?)\s*={3,}\s*$')
+_SCORE_RE = re.compile(r'\d+')
+
+# Patterns used to scrub leaked labels out of question and option text
+_ANSWER_SPLIT_RE = re.compile(r'\n?(?:ОТВЕТ:|ANSWER:|DIFFICULTY:|СЛОЖНОСТЬ:|SCORE:)')
+_LEADING_LABEL_RE = re.compile(r'^\s*(?:\**(?:QUESTION|ВОПРОС)\**\s*:\**)?[\s:]*')
+_OPTIONS_SPLIT_RE = re.compile(r'\n?OPTIONS:')
+# Only whole lines: "Java 8. Streams are lazy" is not an option
+_NUMBERED_OPTION_RE = re.compile(r'\n?^[ \t]*\d+\. .*', re.MULTILINE)
+_INLINE_ANSWER_RE = re.compile(r'\(Answer:.*?\)')
+
+QUESTION = "question"
+ANSWER = "answer"
+DIFFICULTY = "difficulty"
+SCORE = "score"
+OPTIONS = "options"
+
+_LABELS = {
+    "QUESTION": QUESTION,
+    "ВОПРОС": QUESTION,
+    "ANSWER": ANSWER,
+    "ОТВЕТ": ANSWER,
+    "DIFFICULTY": DIFFICULTY,
+    "СЛОЖНОСТЬ": DIFFICULTY,
+    "SCORE": SCORE,
+    "OPTIONS": OPTIONS,
+    "ВАРИАНТЫ": OPTIONS,
+}
+
+DIFFICULTIES = ("easy", "medium", "hard")
+EXPECTED_OPTIONS = 4
+
+
+class ParsedQuestion(TypedDict):
+    question: str
+    correct_answer: str
+    options: List[str]
+    difficulty: str
+    score: int
+
+
+class ParseError(TypedDict):
+    block: int
+    line: int
+    error: str
+
+
+def clean_question_text(text: str) -> str:
+    """Clean the question text by removing answer options and answer labels"""
+    # Remove a leaked "QUESTION:" label or the bare ": " it leaves behind
+    text = _LEADING_LABEL_RE.sub('', text)
+
+    # Remove everything after "ОТВЕТ:", "ANSWER:" or the difficulty/score fields
+    text = _ANSWER_SPLIT_RE.split(text)[0]
+
+    # Remove OPTIONS section if present
+    text = _OPTIONS_SPLIT_RE.split(text)[0]
+
+    # Remove numbered options (1., 2., 3., 4.)
+    text = _NUMBERED_OPTION_RE.sub('', text)
+
+    # Remove any trailing whitespace or newlines
+    return text.strip()
+
+
+def has_leaked_labels(text: str) -> bool:
+    """True if question text carries a leaked label: a leading "QUESTION:" or ": ", or an answer/options marker"""
+    if _LEADING_LABEL_RE.match(text).group(0).strip():
+        return True
+    return bool(_ANSWER_SPLIT_RE.search(text) or _OPTIONS_SPLIT_RE.search(text))
+
+
+def clean_option_text(text: str) -> str:
+    """Clean the option text by removing answer labels and other artifacts"""
+    # Remove "(Answer: ...)" patterns
+    text = _INLINE_ANSWER_RE.sub('', text)
+
+    # Remove "Answer:" text
+    text = text.replace('Answer:', '').replace('ANSWER:', '')
+
+    # Remove any trailing whitespace or newlines
+    return text.strip()
+
+
+class ResponseParser:
+    """Single-pass state machine over the QUESTION/ANSWER/OPTIONS response format.
+
+    Text can be fed in arbitrary chunks; every complete question is returned as
+    soon as its "===" terminator (or the next QUESTION label) is seen. Blocks
+    that cannot be turned into a valid question are recorded in `errors`
+    instead of producing garbage records.
+    """
+
+    def __init__(self):
+        self.errors: List[ParseError] = []
+        self._pending = ""
+        self._line_number = 0
+        self._block = 0
+        self._reset_block()
+
+    def _reset_block(self) -> None:
+        self._fields: Dict[str, List[str]] = {}
+        self._options: List[str] = []
+        self._field: Optional[str] = None
+        self._block_line = self._line_number + 1
+
+    def feed(self, chunk: str) -> List[ParsedQuestion]:
+        """Consume a chunk of response text and return the questions it completed"""
+        if not chunk:
+            return []
+        lines = (self._pending + chunk).split("\n")
+        self._pending = lines.pop()
+        parsed = []
+        for line in lines:
+            question = self._consume_line(line)
+            if question is not None:
+                parsed.append(question)
+        return parsed
+
+    def close(self) -> List[ParsedQuestion]:
+        """Flush the trailing, unterminated block"""
+        parsed = []
+        if self._pending:
+            question = self._consume_line(self._pending)
+            self._pending = ""
+            if question is not None:
+                parsed.append(question)
+        if self._fields or self._options:
+            question = self._finish_block()
+            if question is not None:
+                parsed.append(question)
+        return parsed
+
+    def parse(self, text: str) -> Tuple[List[ParsedQuestion], List[ParseError]]:
+        """Parse a complete response"""
+        questions = self.feed(text)
+        questions.extend(self.close())
+        return questions, self.errors
+
+    def _consume_line(self, line: str) -> Optional[ParsedQuestion]:
+        self._line_number += 1
+        line = line.rstrip("\r")
+
+        separator = _SEPARATOR_RE.match(line)
+        if separator:
+            if separator.group(1).strip():
+                self._consume_content(separator.group(1))
+            if self._fields or self._options:
+                return self._finish_block()
+            self._reset_block()
+            return None
+
+        label = _LABEL_RE.match(line)
+        if label:
+            field = _LABELS[label.group(1)]
+            finished = None
+            # A new QUESTION without a "===" before it closes the previous block
+            if field == QUESTION and (self._fields or self._options):
+                finished = self._finish_block()
+            self._field = field
+            if field == OPTIONS:
+                if label.group(2).strip():
+                    self._consume_content(label.group(2))
+            else:
+                self._fields[field] = [label.group(2)]
+            return finished
+
+        self._consume_content(line)
+        return None
+
+    def _consume_content(self, line: str) -> None:
+        if self._field == OPTIONS:
+            option = _OPTION_RE.match(line)
+            if option:
+                self._options.append(option.group(2))
+            elif line.strip() and self._options:
+                # Multi-line option (e.g. a code snippet)
+                self._options[-1] += "\n" + line
+        elif self._field is not None:
+            self._fields[self._field].append(line)
+
+    def _error(self, message: str) -> None:
+        self.errors.append({"block": self._block, "line": self._block_line, "error": message})
+
+    def _finish_block(self) -> Optional[ParsedQuestion]:
+        fields, options = self._fields, self._options
+        try:
+            if QUESTION not in fields:
+                self._error("missing QUESTION")
+                return None
+            question_text = clean_question_text("\n".join(fields[QUESTION]))
+            if not question_text:
+                self._error("empty QUESTION")
+                return None
+            cleaned_options = [clean_option_text(option) for option in options]
+            if len(cleaned_options) != EXPECTED_OPTIONS or not all(cleaned_options):
+                self._error(f"expected {EXPECTED_OPTIONS} options, got {len(cleaned_options)}")
+                return None
+
+            difficulty = "\n".join(fields.get(DIFFICULTY, [])).strip().lower()
+            score_match = _SCORE_RE.search("\n".join(fields.get(SCORE, [])))
+            return {
+                "question": question_text,
+                # The first option is the correct answer by contract with the prompt
+                "correct_answer": cleaned_options[0],
+                "options": cleaned_options,
+                "difficulty": difficulty if difficulty in DIFFICULTIES else "medium",
+                "score": int(score_match.group()) if score_match else 5,
+            }
+        finally:
+            self._block += 1
+            self._reset_block()
+
+
+def parse_response(text: str) -> Tuple[List[ParsedQuestion], List[ParseError]]:
+    """Parse a full LLM response into questions and structured parse errors"""
+    return ResponseParser().parse(text)
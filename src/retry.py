@@ -0,0 +1,156 @@
+import logging
+import random
+import threading
+import time
+from typing import Optional
+
+from llm_backends import RateLimitError, TransientLLMError
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT = "rate_limit"
+TRANSIENT = "transient"
+PARSE = "parse"
+FATAL = "fatal"
+
+_RATE_LIMIT_MARKERS = ("429", "resourceexhausted", "resource exhausted", "rate limit", "ratelimit", "quota")
+_FATAL_MARKERS = ("401", "403", "permissiondenied", "unauthenticated", "api key not valid", "invalid api key")
+
+
+def classify_error(error: BaseException) -> str:
+    """Map an exception raised while generating a batch to a retry category"""
+    if isinstance(error, RateLimitError):
+        return RATE_LIMIT
+    if isinstance(error, TransientLLMError):
+        return TRANSIENT
+    description = f"{type(error).__name__} {error}".lower()
+    if any(marker in description for marker in _RATE_LIMIT_MARKERS):
+        return RATE_LIMIT
+    if any(marker in description for marker in _FATAL_MARKERS):
+        return FATAL
+    # Timeouts, dropped connections, 5xx and anything unknown are retried
+    return TRANSIENT
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter and a per-category failure budget"""
+
+    def __init__(
+        self,
+        base_delay: float = 1.0,
+        rate_limit_base_delay: float = 10.0,
+        max_delay: float = 60.0,
+        max_failures: int = 6,
+        jitter: bool = True,
+    ):
+        self.base_delay = base_delay
+        self.rate_limit_base_delay = rate_limit_base_delay
+        self.max_delay = max_delay
+        self.max_failures = max_failures
+        self.jitter = jitter
+
+    def delay(self, failures: int, kind: str) -> float:
+        """Delay before the next attempt after `failures` consecutive failures"""
+        base = self.rate_limit_base_delay if kind == RATE_LIMIT else self.base_delay
+        ceiling = min(self.max_delay, base * 2 ** max(0, failures - 1))
+        return random.uniform(0, ceiling) if self.jitter else ceiling
+
+
+class RetryState:
+    """Consecutive-failure tracking for one category"""
+
+    def __init__(self, policy: RetryPolicy):
+        self.policy = policy
+        self.failures = 0
+        self.exhausted = False
+        self._lock = threading.Lock()
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+
+    def record_failure(self, kind: str) -> Optional[float]:
+        """Return how long to wait before retrying, or None once the budget is spent"""
+        with self._lock:
+            self.failures += 1
+            if kind == FATAL or self.failures >= self.policy.max_failures:
+                self.exhausted = True
+                return None
+            return self.policy.delay(self.failures, kind)
+
+
+class CircuitBreaker:
+    """Stops calling the LLM backend after repeated backend failures.
+
+    After `failure_threshold` consecutive failed LLM calls the
+    breaker opens for `reset_timeout` seconds; then a single trial call is let
+    through (half-open) and its outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def retry_after(self) -> float:
+        """Seconds until new calls may be attempted, without claiming the half-open trial"""
+        with self._lock:
+            if self.opened_at is None:
+                return 0.0
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0:
+                return remaining
+            return min(1.0, self.reset_timeout) if self._trial_in_flight else 0.0
+
+    def allow(self) -> float:
+        """Return 0 if a call may proceed now, otherwise the seconds to wait"""
+        with self._lock:
+            if self.opened_at is None:
+                return 0.0
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0:
+                return remaining
+            if self._trial_in_flight:
+                return min(1.0, self.reset_timeout)
+            self._trial_in_flight = True
+            return 0.0
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info("LLM circuit breaker closed")
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._trial_in_flight or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self._trial_in_flight:
+                    logger.warning(f"LLM circuit breaker open for {self.reset_timeout}s "
+                                   f"after {self.failures} consecutive failures")
+                self.opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    def wait(self) -> float:
+        """Block until a call is allowed, return the time spent waiting"""
+        waited = 0.0
+        while True:
+            delay = self.allow()
+            if not delay:
+                return waited
+            time.sleep(delay)
+            waited += delay
@@ -0,0 +1,378 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+from batch_sizing import BatchSizer
+from context_selection import bounded_history
+from database import GENERATOR_QUESTION_COLUMNS
+from dedup import DuplicateIndex, DUPLICATE, FLAGGED
+from metrics import metrics
+from question_generator import QuestionGenerator
+from retry import CircuitBreaker, RetryPolicy, RetryState, classify_error, FATAL, PARSE, RATE_LIMIT, TRANSIENT
+
+logger = logging.getLogger(__name__)
+
+
+def load_existing_questions(db, category_id: int) -> Tuple[List[Dict], DuplicateIndex, int]:
+    """Stream a category's questions once into a duplicate index and a bounded prompt history.
+
+    Only the columns the generator uses are fetched, and the full result set
+    is never held in memory: the index keeps signatures, the history keeps a
+    few hundred questions for ContextSelector. Returns (history, index, count).
+    """
+    index = DuplicateIndex()
+    count = 0
+
+    def indexed(questions):
+        nonlocal count
+        for question in questions:
+            index.add(question["question"], question["correct_answer"])
+            count += 1
+            yield question
+
+    history = bounded_history(indexed(db.iter_questions(category_id, columns=GENERATOR_QUESTION_COLUMNS)),
+                              seed=category_id)
+    return history, index, count
+
+
+class TokenBucket:
+    """Thread-safe token-bucket rate limiter shared by all worker threads"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Block until `tokens` are available, return the time spent waiting"""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class CategoryJob:
+    """Per-category quota bookkeeping shared by the batches of one category.
+
+    Batches reserve slots before calling the LLM, so the sum of in-flight
+    reservations never exceeds what is still missing and the category stops
+    exactly at `num_questions`. After a failed batch the category is not
+    scheduled again before `not_before`, and it is abandoned once its retry
+    budget is spent.
+    """
+
+    def __init__(self, category: Dict, num_questions: int, generator, existing_questions: List[Dict],
+                 retry_policy: RetryPolicy, dedup_index: Optional[DuplicateIndex] = None,
+                 existing_count: Optional[int] = None):
+        self.category = category
+        self.num_questions = num_questions
+        self.generator = generator
+        self.existing_questions = existing_questions
+        # Size of the category when the job started; existing_questions may be a bounded sample of it
+        self.existing_count = existing_count if existing_count is not None else len(existing_questions)
+        self.dedup_index = dedup_index if dedup_index is not None else DuplicateIndex.from_questions(existing_questions)
+        self.retry = RetryState(retry_policy)
+        self.not_before = 0.0
+        self.accepted = 0
+        self.reserved = 0
+        self.active_batches = 0
+        self.lock = threading.Lock()
+
+    @property
+    def done(self) -> bool:
+        with self.lock:
+            return self.accepted >= self.num_questions or self.retry.exhausted
+
+    def reserve(self, batch_size: int) -> int:
+        """Reserve up to `batch_size` question slots, return how many were granted"""
+        with self.lock:
+            if self.retry.exhausted or time.monotonic() < self.not_before:
+                return 0
+            granted = min(batch_size, self.num_questions - self.accepted - self.reserved)
+            if granted <= 0:
+                return 0
+            self.reserved += granted
+            self.active_batches += 1
+            return granted
+
+    def cancel(self, reserved: int) -> None:
+        """Give back a reservation whose batch was never started"""
+        with self.lock:
+            self.reserved -= reserved
+            self.active_batches -= 1
+
+    def release(self, reserved: int, accepted_questions: List[Dict]) -> None:
+        """Return a batch reservation and record the questions it stored"""
+        with self.lock:
+            self.reserved -= reserved
+            self.active_batches -= 1
+            self.accepted += len(accepted_questions)
+            self.existing_questions.extend(accepted_questions)
+
+    def snapshot_existing(self) -> List[Dict]:
+        with self.lock:
+            return list(self.existing_questions)
+
+    @property
+    def total_questions(self) -> int:
+        """Questions the category holds now, as far as this job knows"""
+        with self.lock:
+            return self.existing_count + self.accepted
+
+
+class GenerationScheduler:
+    """Runs categories and their batches concurrently on a bounded thread pool"""
+
+    def __init__(
+        self,
+        db,
+        max_workers: int = 8,
+        per_category: int = 2,
+        requests_per_second: float = 1.0,
+        batch_size: int = 15,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        stream: bool = False,
+        flush_size: int = 5,
+        generator_factory: Callable = QuestionGenerator,
+        on_stored: Optional[Callable[[Dict, int], None]] = None,
+        batch_sizer: Optional[BatchSizer] = None,
+        on_batch_done: Optional[Callable[[Dict], None]] = None,
+    ):
+        self.db = db
+        self.max_workers = max(1, max_workers)
+        self.per_category = max(1, per_category)
+        self.batch_size = batch_size
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.circuit_breaker = circuit_breaker if circuit_breaker is not None else CircuitBreaker()
+        self.stream = stream
+        self.flush_size = max(1, flush_size)
+        self.rate_limiter = TokenBucket(requests_per_second)
+        self.generator_factory = generator_factory
+        self.on_stored = on_stored
+        self.batch_sizer = batch_sizer
+        # Called with the category on the batch's own thread once its questions are stored (or lost)
+        self.on_batch_done = on_batch_done
+
+    def batch_size_for(self, job: "CategoryJob") -> int:
+        """Size of the next batch of a category: adaptive with a batch sizer, fixed otherwise"""
+        if self.batch_sizer is None:
+            return self.batch_size
+        return self.batch_sizer.size(job.category['name'])
+
+    def _record_batch(self, job: "CategoryJob", batch_size: int, accepted: int, seconds: float) -> None:
+        if self.batch_sizer is None:
+            return
+        last_call = getattr(job.generator, "last_call", None) or {}
+        if last_call.get("cached"):
+            # Replayed responses say nothing about the model's latency or output size
+            return
+        self.batch_sizer.record(
+            job.category['name'], batch_size, accepted, seconds,
+            prompt_tokens=last_call.get("prompt_tokens"),
+            response_tokens=last_call.get("response_tokens"),
+            parsed=last_call.get("parsed"),
+            complete=last_call.get("complete", True)
+        )
+
+    def _make_job(self, category: Dict, num_questions: int) -> CategoryJob:
+        generator = self.generator_factory(category['name'], category['name_ru'])
+        existing_questions, dedup_index, count = load_existing_questions(self.db, category['id'])
+        logger.info(f"Found {count} existing questions for {category['name']}")
+        return CategoryJob(category, num_questions, generator, existing_questions, self.retry_policy, dedup_index,
+                           existing_count=count)
+
+    def _store(self, job: CategoryJob, admitted: List, accepted: List[Dict],
+               on_insert: Optional[Callable] = None) -> None:
+        """Insert admitted questions in one transaction and record the ones that were stored"""
+        category = job.category
+        result = self.db.insert_questions([question_data for question_data, _ in admitted], category['id'],
+                                          on_insert=on_insert)
+        for (question_data, dedup_key), new_id in zip(admitted, result["ids"]):
+            if new_id is not None:
+                accepted.append(question_data)
+                metrics.increment("accepted", category=category['name'])
+                logger.info(f"✓ [{category['name']}] Added: {question_data['question']}")
+            else:
+                job.dedup_index.discard(dedup_key)
+                metrics.increment("rejected", category=category['name'])
+                logger.error(f"✗ [{category['name']}] Failed to add: {question_data['question']}")
+        stored = sum(1 for new_id in result["ids"] if new_id is not None)
+        if stored and self.on_stored is not None:
+            self.on_stored(category, stored)
+
+    def _backoff(self, job: CategoryJob, kind: str) -> None:
+        """Schedule the next attempt of a category after a failed batch"""
+        category = job.category
+        delay = job.retry.record_failure(kind)
+        metrics.increment("retries", category=category['name'], kind=kind)
+        if delay is None:
+            metrics.increment("categories_abandoned", category=category['name'])
+            logger.error(f"[{category['name']}] Giving up after {job.retry.failures} failed batches ({kind})")
+            return
+        metrics.increment("sleep_seconds", delay, category=category['name'])
+        logger.info(f"[{category['name']}] Retrying in {delay:.1f}s ({kind}, attempt {job.retry.failures})")
+        with job.lock:
+            job.not_before = max(job.not_before, time.monotonic() + delay)
+
+    def _run_batch(self, job: CategoryJob, batch_size: int, on_insert: Optional[Callable] = None) -> int:
+        category = job.category
+        accepted: List[Dict] = []
+        started = generation_started = time.perf_counter()
+        kind = None
+        try:
+            waited = self.rate_limiter.acquire()
+            # The sizer judges a batch size by generation time, not time spent queued for the rate limit
+            generation_started = time.perf_counter()
+            if waited:
+                metrics.increment("rate_limit_wait_seconds", waited, category=category['name'])
+            logger.info(f"[{category['name']}] Generating batch of {batch_size} questions")
+            existing_questions = job.snapshot_existing()
+            total_questions = job.total_questions
+            if self.stream:
+                new_questions = job.generator.generate_questions_stream(existing_questions, batch_size,
+                                                                        total_questions)
+            else:
+                new_questions = job.generator.generate_questions(existing_questions, batch_size, total_questions)
+
+            admitted = []
+            try:
+                for question_data in new_questions:
+                    if len(accepted) + len(admitted) >= batch_size:
+                        break
+                    verdict, dedup_key = job.dedup_index.check_and_add(
+                        question_data['question'], question_data.get('correct_answer', '')
+                    )
+                    if verdict['status'] == DUPLICATE:
+                        metrics.increment("duplicates", category=category['name'])
+                        logger.info(f"✗ [{category['name']}] Skipped near-duplicate "
+                                    f"({verdict['similarity']:.2f}): {question_data['question']}")
+                        continue
+                    if verdict['status'] == FLAGGED:
+                        metrics.increment("flagged", category=category['name'])
+                        logger.warning(f"[{category['name']}] Possible duplicate "
+                                       f"({verdict['similarity']:.2f}): {question_data['question']}")
+                    admitted.append((question_data, dedup_key))
+
+                    # In streaming mode persist questions while the rest is still generating
+                    if self.stream and len(admitted) >= self.flush_size:
+                        self._store(job, admitted, accepted, on_insert)
+                        admitted = []
+            finally:
+                if self.stream:
+                    # Finish the generator's bookkeeping (token counts, completeness) before the batch is judged
+                    new_questions.close()
+                # Questions completed before a mid-stream failure are still stored
+                if admitted:
+                    self._store(job, admitted, accepted, on_insert)
+
+            self.circuit_breaker.record_success()
+            if accepted:
+                job.retry.record_success()
+            else:
+                logger.info(f"[{category['name']}] No questions processed in this batch")
+                self._backoff(job, PARSE)
+        except Exception as e:
+            kind = classify_error(e)
+            logger.error(f"[{category['name']}] Error in batch generation ({kind}): {str(e)}")
+            logger.debug("Full error:", exc_info=True)
+            metrics.increment("batch_errors", category=category['name'], kind=kind)
+            self.circuit_breaker.record_failure()
+            self._backoff(job, kind)
+        finally:
+            if self.on_batch_done is not None:
+                try:
+                    self.on_batch_done(category)
+                except Exception as e:
+                    logger.error(f"[{category['name']}] Error in batch completion callback: {e}")
+            job.release(batch_size, accepted)
+            metrics.observe("batch", time.perf_counter() - started, category=category['name'])
+            # Rate limits, transient backend failures and fatal errors are not caused by the batch size
+            if kind not in (RATE_LIMIT, TRANSIENT, FATAL):
+                self._record_batch(job, batch_size, len(accepted), time.perf_counter() - generation_started)
+        return len(accepted)
+
+    def run_batch(self, job: CategoryJob, batch_size: int, on_insert: Optional[Callable] = None) -> Optional[int]:
+        """Run one batch of `job` on the calling thread, for callers that schedule batches themselves.
+
+        Returns the number of stored questions, or None if no batch was started
+        because the category is backing off or the circuit breaker is open.
+        `on_insert` is passed to Database.insert_questions for every insert.
+        """
+        granted = job.reserve(batch_size)
+        if not granted:
+            return None
+        # The half-open trial is claimed only here, right before an LLM call that will report back to it
+        if self.circuit_breaker.allow():
+            job.cancel(granted)
+            return None
+        return self._run_batch(job, granted, on_insert)
+
+    def _submit_ready(self, executor, jobs: List[CategoryJob], futures: Dict) -> None:
+        for job in jobs:
+            while job.active_batches < self.per_category:
+                granted = job.reserve(self.batch_size_for(job))
+                if not granted:
+                    break
+                # While the breaker is open nothing is submitted; half-open lets one trial through
+                if self.circuit_breaker.allow():
+                    job.cancel(granted)
+                    return
+                futures[executor.submit(self._run_batch, job, granted)] = job
+
+    def _next_wakeup(self, jobs: List[CategoryJob]) -> Optional[float]:
+        """Seconds until a backed-off category or the circuit breaker allows new work"""
+        now = time.monotonic()
+        pending = [job for job in jobs if not job.done and not job.active_batches]
+        if not pending:
+            return None
+        earliest = min(max(0.0, job.not_before - now) for job in pending)
+        return max(earliest, self.circuit_breaker.retry_after(), 0.01)
+
+    def run(self, categories: List[Dict], num_questions: int = 30,
+            targets: Optional[Dict[int, int]] = None) -> Dict[int, int]:
+        """Generate new questions for every category, return counts by category id.
+
+        Each category gets `num_questions` unless `targets` maps its id to a
+        category-specific count.
+        """
+        targets = targets or {}
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="generate") as executor:
+            job_futures = [
+                executor.submit(self._make_job, category, targets.get(category['id'], num_questions))
+                for category in categories
+            ]
+            jobs = [future.result() for future in job_futures]
+
+            futures: Dict = {}
+            self._submit_ready(executor, jobs, futures)
+            while True:
+                wakeup = self._next_wakeup(jobs)
+                if not futures:
+                    if wakeup is None:
+                        break
+                    time.sleep(max(wakeup, 0.01))
+                else:
+                    finished, _ = wait(futures, timeout=wakeup, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        job = futures.pop(future)
+                        future.result()
+                        if job.done:
+                            logger.info(f"Finished {job.category['name']}: added {job.accepted} new questions")
+                self._submit_ready(executor, jobs, futures)
+
+        return {job.category['id']: job.accepted for job in jobs}
@@ -0,0 +1,166 @@
+import argparse
+import logging
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# SQLite mirror of the production tables, used by the benchmark harness and
+# local runs that should not need a Postgres server. `options` is stored as a
+# JSON string because SQLite has no array type (see Database._encode_options).
+SQLITE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS categories (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        name_ru TEXT NOT NULL,
+        slug TEXT NOT NULL UNIQUE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS quiz_questions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        category_id INTEGER NOT NULL REFERENCES categories (id),
+        question TEXT NOT NULL,
+        correct_answer TEXT NOT NULL,
+        options TEXT NOT NULL,
+        difficulty TEXT,
+        score INTEGER
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS quiz_questions_category_id ON quiz_questions (category_id)",
+    """
+    CREATE TABLE IF NOT EXISTS user_scores (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        category_id INTEGER NOT NULL REFERENCES categories (id),
+        score INTEGER NOT NULL,
+        correct_answers INTEGER NOT NULL,
+        completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+]
+
+
+# Per-user, per-category aggregate of user_scores, maintained by
+# Database.save_user_score in the same transaction as the score row. Portable
+# between Postgres and SQLite, so it is also the Postgres migration: run
+# `python schema.py migrate-leaderboard` against production before deploying;
+# until then score saves fail. Rerunning it recomputes every row.
+LEADERBOARD_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS user_category_stats (
+        user_id INTEGER NOT NULL,
+        category_id INTEGER NOT NULL REFERENCES categories (id),
+        attempts INTEGER NOT NULL,
+        total_score BIGINT NOT NULL,
+        best_score INTEGER NOT NULL,
+        total_correct BIGINT NOT NULL,
+        last_completed_at TIMESTAMP,
+        PRIMARY KEY (user_id, category_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS user_category_stats_total ON user_category_stats (category_id, total_score DESC, user_id)",
+    "CREATE INDEX IF NOT EXISTS user_category_stats_best ON user_category_stats (category_id, best_score DESC, user_id)",
+]
+
+# Recomputes the aggregate from the score history, so running it again repairs any drift
+LEADERBOARD_BACKFILL = """
+    INSERT INTO user_category_stats
+    (user_id, category_id, attempts, total_score, best_score, total_correct, last_completed_at)
+    SELECT user_id, category_id, COUNT(*), SUM(score), MAX(score), SUM(correct_answers), MAX(completed_at)
+    FROM user_scores
+    WHERE true
+    GROUP BY user_id, category_id
+    ON CONFLICT (user_id, category_id) DO UPDATE SET
+        attempts = excluded.attempts,
+        total_score = excluded.total_score,
+        best_score = excluded.best_score,
+        total_correct = excluded.total_correct,
+        last_completed_at = excluded.last_completed_at
+"""
+
+
+# Generation work items shared by worker processes (see work_queue.py).
+# Portable between Postgres and SQLite; times are epoch seconds.
+WORK_QUEUE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS generation_work (
+        job_id TEXT NOT NULL,
+        category_id INTEGER NOT NULL REFERENCES categories (id),
+        batch_no INTEGER NOT NULL,
+        num_questions INTEGER NOT NULL,
+        accepted INTEGER NOT NULL DEFAULT 0,
+        status TEXT NOT NULL,
+        lease_owner TEXT,
+        lease_expires_at DOUBLE PRECISION,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_error TEXT,
+        updated_at DOUBLE PRECISION NOT NULL,
+        PRIMARY KEY (job_id, category_id, batch_no)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS generation_work_claim ON generation_work (job_id, status, lease_expires_at)",
+    # Parameters a job was enqueued with, so a rerun with different ones is refused
+    """
+    CREATE TABLE IF NOT EXISTS generation_jobs (
+        job_id TEXT PRIMARY KEY,
+        parameters TEXT NOT NULL,
+        created_at DOUBLE PRECISION NOT NULL
+    )
+    """,
+]
+
+
+def create_work_queue_schema(engine) -> None:
+    """Create the generation work queue table (Postgres or SQLite)"""
+    with engine.begin() as connection:
+        for statement in WORK_QUEUE_SCHEMA:
+            connection.execute(text(statement))
+
+
+def create_leaderboard_schema(engine) -> None:
+    """Create the leaderboard aggregate and reconcile it with user_scores (Postgres or SQLite)"""
+    with engine.begin() as connection:
+        for statement in LEADERBOARD_SCHEMA:
+            connection.execute(text(statement))
+        if engine.dialect.name == "postgresql":
+            # Scores saved while the backfill runs would be overwritten by its older totals
+            connection.execute(text("LOCK TABLE user_scores IN SHARE MODE"))
+        connection.execute(text(LEADERBOARD_BACKFILL))
+
+
+def create_sqlite_schema(engine) -> None:
+    """Create the quiz tables in an empty SQLite database"""
+    with engine.begin() as connection:
+        for statement in SQLITE_SCHEMA:
+            connection.execute(text(statement))
+    create_leaderboard_schema(engine)
+
+
+def main():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--database-url", help="Defaults to DATABASE_URL")
+    parser = argparse.ArgumentParser(description="Create or migrate database tables")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("migrate-leaderboard", parents=[common],
+                          help="Create user_category_stats and recompute it from user_scores (idempotent)")
+    subparsers.add_parser("migrate-work-queue", parents=[common], help="Create the generation_work table (idempotent)")
+    subparsers.add_parser("create-sqlite", parents=[common], help="Create all quiz tables in an empty SQLite database")
+    args = parser.parse_args()
+
+    from database import Database
+
+    engine = Database(args.database_url).engine
+    if args.command == "migrate-leaderboard":
+        create_leaderboard_schema(engine)
+    elif args.command == "migrate-work-queue":
+        create_work_queue_schema(engine)
+    else:
+        create_sqlite_schema(engine)
+    logger.info(f"{args.command} done")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main()
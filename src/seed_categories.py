@@ -88,31 +88,27 @@ JAVA_CATEGORIES = [
     # }
 ]
 
-def seed_categories(db: Database) -> None:
+def seed_categories(db: Database, categories: List[Dict] = JAVA_CATEGORIES) -> None:
     """Seed the categories table with Java learning topics"""
+    if not categories:
+        return
     try:
+        # One multi-row upsert, whatever the number of categories
+        values = ", ".join(f"(:name_{n}, :name_ru_{n}, :slug_{n})" for n in range(len(categories)))
+        params = {}
+        for n, category in enumerate(categories):
+            params.update({f"name_{n}": category["name"], f"name_ru_{n}": category["name_ru"], f"slug_{n}": category["slug"]})
         with db.engine.begin() as connection:
-            # First, check which categories already exist
-            existing = connection.execute(
-                text("SELECT slug FROM categories")
-            ).fetchall()
-            existing_slugs = {row[0] for row in existing}
-            
-            # Insert only new categories
-            for category in JAVA_CATEGORIES:
-                if category["slug"] not in existing_slugs:
-                    connection.execute(
-                        text("""
-                            INSERT INTO categories (name, name_ru, slug)
-                            VALUES (:name, :name_ru, :slug)
-                        """),
-                        category
-                    )
-                    logger.info(f"Added category: {category['name']} ({category['name_ru']})")
-                else:
-                    logger.info(f"Category already exists: {category['name']}")
-                    
-        logger.info("Categories seeding completed successfully")
+            connection.execute(
+                text(f"""
+                    INSERT INTO categories (name, name_ru, slug)
+                    VALUES {values}
+                    ON CONFLICT (slug) DO UPDATE SET name = excluded.name, name_ru = excluded.name_ru
+                """),
+                params
+            )
+        db.invalidate_categories()
+        logger.info(f"Categories seeding completed successfully ({len(categories)} categories upserted)")
     except Exception as e:
         logger.error(f"Error seeding categories: {e}")
         raise
@@ -0,0 +1,408 @@
+import json
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from context_selection import bounded_history
+from database import text
+from dedup import DuplicateIndex, DUPLICATE
+from metrics import metrics
+from scheduler import CategoryJob, GenerationScheduler
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+ITEM_COLUMNS = ("job_id", "category_id", "batch_no", "num_questions", "accepted", "attempts")
+
+
+class LeaseLost(Exception):
+    """A work item's lease expired and was claimed by another worker"""
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class WorkQueue:
+    """Generation work items in the shared database, claimed under expiring leases.
+
+    Every item asks for `num_questions` questions of one category. A worker
+    claims items with SELECT ... FOR UPDATE SKIP LOCKED (on SQLite the claiming
+    UPDATE is atomic by itself), so concurrent workers on any number of
+    machines never get the same item. If a worker dies, its leases expire
+    after `lease_seconds` and the items are claimed again. Worker clocks are
+    assumed to be in sync to well within the lease duration.
+    """
+
+    def __init__(self, db, lease_seconds: float = 300.0):
+        from schema import create_work_queue_schema
+
+        self.db = db
+        self.lease_seconds = lease_seconds
+        self.skip_locked = db.engine.dialect.name == "postgresql"
+        create_work_queue_schema(db.engine)
+
+    def enqueue(self, job_id: str, targets: Dict[int, int], batch_size: int = 15,
+                parameters: Optional[Dict] = None) -> int:
+        """Split per-category question targets into batch items.
+
+        `parameters` (e.g. {"target": 120}) are stored with a new job. Enqueuing
+        an existing job again adds nothing, so workers can join it at any time,
+        but raises ValueError if it was started with other parameters.
+        """
+        now = time.time()
+        encoded = json.dumps(parameters or {}, sort_keys=True)
+        rows = []
+        for category_id, num_questions in targets.items():
+            for batch_no, start in enumerate(range(0, num_questions, batch_size)):
+                rows.append({
+                    "job_id": job_id,
+                    "category_id": category_id,
+                    "batch_no": batch_no,
+                    "num_questions": min(batch_size, num_questions - start),
+                    "status": PENDING,
+                    "updated_at": now
+                })
+        with self.db.engine.begin() as connection:
+            connection.execute(
+                text("""
+                    INSERT INTO generation_jobs (job_id, parameters, created_at) VALUES (:job_id, :parameters, :now)
+                    ON CONFLICT (job_id) DO NOTHING
+                """),
+                {"job_id": job_id, "parameters": encoded, "now": now}
+            )
+            stored = connection.execute(
+                text("SELECT parameters FROM generation_jobs WHERE job_id = :job_id"), {"job_id": job_id}
+            ).scalar()
+            if stored != encoded:
+                raise ValueError(f"Job {job_id} was started with {stored}, not {encoded}; use another job id")
+            if not rows:
+                return 0
+            result = connection.execute(
+                text("""
+                    INSERT INTO generation_work (job_id, category_id, batch_no, num_questions, status, updated_at)
+                    VALUES (:job_id, :category_id, :batch_no, :num_questions, :status, :updated_at)
+                    ON CONFLICT (job_id, category_id, batch_no) DO NOTHING
+                """),
+                rows
+            )
+        added = max(result.rowcount, 0)
+        logger.info(f"Enqueued {added} new work items for job {job_id} ({len(rows) - added} already queued)")
+        if not added and rows and not self.remaining(job_id):
+            logger.warning(f"Job {job_id} has already finished, nothing to do; use a new job id for another run")
+        return added
+
+    def claim(self, job_id: str, worker_id: str, limit: int = 1) -> List[Dict]:
+        """Lease up to `limit` claimable items: pending ones past their retry time, or expired leases"""
+        now = time.time()
+        lock = "FOR UPDATE SKIP LOCKED" if self.skip_locked else ""
+        with metrics.timer("queue_claim"), self.db.engine.begin() as connection:
+            result = connection.execute(
+                text(f"""
+                    UPDATE generation_work
+                    SET status = :leased, lease_owner = :worker_id, lease_expires_at = :expires_at,
+                        attempts = attempts + 1, updated_at = :now
+                    WHERE (job_id, category_id, batch_no) IN (
+                        SELECT job_id, category_id, batch_no
+                        FROM generation_work
+                        WHERE job_id = :job_id
+                          AND status IN (:pending, :leased)
+                          AND COALESCE(lease_expires_at, 0) <= :now
+                        ORDER BY batch_no, category_id
+                        LIMIT :limit
+                        {lock}
+                    )
+                    RETURNING {", ".join(ITEM_COLUMNS)}
+                """),
+                {
+                    "job_id": job_id,
+                    "worker_id": worker_id,
+                    "pending": PENDING,
+                    "leased": LEASED,
+                    "now": now,
+                    "expires_at": now + self.lease_seconds,
+                    "limit": limit
+                }
+            )
+            items = [dict(zip(ITEM_COLUMNS, row)) for row in result]
+        metrics.increment("queue_claimed", len(items))
+        return items
+
+    def renew(self, worker_id: str) -> int:
+        """Extend every lease held by `worker_id`, return how many are held"""
+        with self.db.engine.begin() as connection:
+            result = connection.execute(
+                text("""
+                    UPDATE generation_work SET lease_expires_at = :expires_at
+                    WHERE lease_owner = :worker_id AND status = :leased
+                """),
+                {"worker_id": worker_id, "leased": LEASED, "expires_at": time.time() + self.lease_seconds}
+            )
+        return result.rowcount
+
+    def record_progress(self, connection, item: Dict, worker_id: str, accepted: int) -> None:
+        """Count questions stored for a leased item, inside the transaction that inserted them.
+
+        Raises LeaseLost if another worker has taken the item over, which rolls
+        the insert back: a reclaimed item is never served twice.
+        """
+        result = connection.execute(
+            text("""
+                UPDATE generation_work
+                SET num_questions = num_questions - :accepted, accepted = accepted + :accepted, updated_at = :now
+                WHERE job_id = :job_id AND category_id = :category_id AND batch_no = :batch_no
+                  AND lease_owner = :worker_id AND status = :leased
+            """),
+            {
+                "accepted": accepted,
+                "now": time.time(),
+                "job_id": item["job_id"],
+                "category_id": item["category_id"],
+                "batch_no": item["batch_no"],
+                "worker_id": worker_id,
+                "leased": LEASED
+            }
+        )
+        if result.rowcount != 1:
+            raise LeaseLost(f"Lease on job {item['job_id']} category {item['category_id']} "
+                            f"batch {item['batch_no']} was lost")
+
+    def finish(self, item: Dict, worker_id: str, retry_after: float = 0.0,
+               failed: bool = False, error: Optional[str] = None) -> bool:
+        """Release a leased item after its batch ran.
+
+        Stored questions were already counted by record_progress. An item with
+        nothing left is done, otherwise it goes back to the queue for the rest,
+        claimable after `retry_after` seconds; `failed` retires it for good.
+        Returns False if the lease had already been lost to another worker.
+        """
+        now = time.time()
+        with self.db.engine.begin() as connection:
+            status = connection.execute(
+                text("""
+                    UPDATE generation_work
+                    SET status = CASE WHEN :failed THEN :failed_status WHEN num_questions <= 0 THEN :done
+                                      ELSE :pending END,
+                        lease_owner = NULL, lease_expires_at = :not_before, last_error = :error, updated_at = :now
+                    WHERE job_id = :job_id AND category_id = :category_id AND batch_no = :batch_no
+                      AND lease_owner = :worker_id AND status = :leased
+                    RETURNING status
+                """),
+                {
+                    "failed": failed,
+                    "failed_status": FAILED,
+                    "done": DONE,
+                    "pending": PENDING,
+                    "not_before": now + retry_after,
+                    "error": error,
+                    "now": now,
+                    "job_id": item["job_id"],
+                    "category_id": item["category_id"],
+                    "batch_no": item["batch_no"],
+                    "worker_id": worker_id,
+                    "leased": LEASED
+                }
+            ).scalar()
+        if status is None:
+            logger.warning(f"Lease on job {item['job_id']} category {item['category_id']} "
+                           f"batch {item['batch_no']} was lost before it finished")
+            return False
+        metrics.increment("queue_finished", status=status)
+        return True
+
+    def release(self, item: Dict, worker_id: str, retry_after: float = 0.0) -> bool:
+        """Hand a leased item back untouched, without counting the attempt, claimable after `retry_after` seconds"""
+        now = time.time()
+        with self.db.engine.begin() as connection:
+            result = connection.execute(
+                text("""
+                    UPDATE generation_work
+                    SET status = :pending, attempts = attempts - 1, lease_owner = NULL,
+                        lease_expires_at = :not_before, updated_at = :now
+                    WHERE job_id = :job_id AND category_id = :category_id AND batch_no = :batch_no
+                      AND lease_owner = :worker_id AND status = :leased
+                """),
+                {
+                    "pending": PENDING,
+                    "not_before": now + retry_after,
+                    "now": now,
+                    "job_id": item["job_id"],
+                    "category_id": item["category_id"],
+                    "batch_no": item["batch_no"],
+                    "worker_id": worker_id,
+                    "leased": LEASED
+                }
+            )
+        return result.rowcount == 1
+
+    def status(self, job_id: str) -> Dict[str, Dict]:
+        """Items, accepted and still missing questions by status"""
+        with self.db.engine.connect() as connection:
+            result = connection.execute(
+                text("""
+                    SELECT status, COUNT(*), SUM(accepted), SUM(num_questions)
+                    FROM generation_work WHERE job_id = :job_id GROUP BY status
+                """),
+                {"job_id": job_id}
+            )
+            return {row[0]: {"items": row[1], "accepted": row[2] or 0, "remaining": row[3] or 0} for row in result}
+
+    def remaining(self, job_id: str) -> int:
+        """Items that are not done or failed yet"""
+        counts = self.status(job_id)
+        return sum(counts.get(status, {}).get("items", 0) for status in (PENDING, LEASED))
+
+
+class WorkerCategory:
+    """A worker's view of one category: its CategoryJob plus how far it has read the table"""
+
+    def __init__(self, job: CategoryJob):
+        self.job = job
+        self.last_id = 0
+        self.lock = threading.Lock()
+
+
+class QueueWorker:
+    """Claims work items from a WorkQueue and generates them with a GenerationScheduler's batch logic.
+
+    Rate limiting, retries, the circuit breaker and duplicate gating are the
+    scheduler's. Before each batch the worker reads questions that were
+    inserted since it last looked, by any worker, into the category's
+    duplicate index, so parallel workers do not store each other's questions
+    again.
+    """
+
+    def __init__(self, db, queue: WorkQueue, scheduler: GenerationScheduler, job_id: str,
+                 worker_id: Optional[str] = None, max_attempts: int = 5, poll_interval: float = 1.0):
+        self.db = db
+        self.queue = queue
+        self.scheduler = scheduler
+        self.job_id = job_id
+        self.worker_id = worker_id or default_worker_id()
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.categories: Dict[int, WorkerCategory] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def _category(self, category_id: int) -> Optional[WorkerCategory]:
+        with self._lock:
+            state = self.categories.get(category_id)
+            if state is None:
+                category = self.db.get_category(category_id)
+                if category is None:
+                    return None
+                generator = self.scheduler.generator_factory(category['name'], category['name_ru'])
+                job = CategoryJob(category, sys.maxsize, generator, [], self.scheduler.retry_policy,
+                                  DuplicateIndex())
+                state = self.categories[category_id] = WorkerCategory(job)
+            return state
+
+    def _refresh(self, state: WorkerCategory) -> None:
+        """Index questions inserted since the last refresh and fold them into the prompt history"""
+        with state.lock:
+            job = state.job
+            while True:
+                page = self.db.get_questions_page(job.category['id'], after_id=state.last_id, limit=1000,
+                                                  columns=("id", "question", "correct_answer"))
+                if not page:
+                    break
+                state.last_id = page[-1]["id"]
+                new_questions = []
+                for question in page:
+                    # Questions this worker stored itself are already indexed
+                    verdict = job.dedup_index.check(question["question"], question["correct_answer"])
+                    if verdict["status"] != DUPLICATE or verdict["similarity"] < 1.0:
+                        job.dedup_index.add(question["question"], question["correct_answer"])
+                        new_questions.append(question)
+                # Folded in page by page, so the first refresh of a large category stays bounded too
+                if new_questions:
+                    with job.lock:
+                        job.existing_count += len(new_questions)
+                        job.existing_questions = bounded_history(job.existing_questions + new_questions,
+                                                                 seed=job.category['id'])
+
+    def _process(self, item: Dict) -> int:
+        state = self._category(item["category_id"])
+        if state is None:
+            self.queue.finish(item, self.worker_id, failed=True, error="unknown category")
+            return 0
+        job = state.job
+        self._refresh(state)
+        # Stored questions are counted on the item in their insert transaction, so a worker dying
+        # before finish() cannot make the next claimant generate them again
+        def record_progress(connection, stored: int) -> None:
+            self.queue.record_progress(connection, item, self.worker_id, stored)
+
+        # Items were sized at enqueue time; an adaptive sizer may serve them in smaller batches
+        accepted = self.scheduler.run_batch(job, min(item["num_questions"], self.scheduler.batch_size_for(job)),
+                                            on_insert=record_progress)
+
+        retry_after = max(0.0, job.not_before - time.monotonic())
+        if accepted is None:
+            # Nothing was generated (category backing off or breaker open): not an attempt
+            retry_after = max(retry_after, self.scheduler.circuit_breaker.retry_after(), self.poll_interval)
+            self.queue.release(item, self.worker_id, retry_after=retry_after)
+            return 0
+        failed = accepted < item["num_questions"] and (
+            job.retry.exhausted or (not accepted and item["attempts"] >= self.max_attempts)
+        )
+        error = None
+        if failed:
+            error = f"gave up after {item['attempts']} attempts" + (" (retry budget spent)" if job.retry.exhausted else "")
+            logger.error(f"[{job.category['name']}] Work item {item['batch_no']} failed: {error}")
+        self.queue.finish(item, self.worker_id, retry_after=retry_after, failed=failed, error=error)
+        return accepted
+
+    def _heartbeat(self) -> None:
+        while not self._stopped.wait(self.queue.lease_seconds / 3):
+            try:
+                self.queue.renew(self.worker_id)
+            except Exception as e:
+                logger.error(f"Error renewing leases of worker {self.worker_id}: {e}")
+
+    def _loop(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                # Only wait out an open breaker here; the half-open trial is taken by the batch that calls the LLM
+                breaker_delay = self.scheduler.circuit_breaker.retry_after()
+                if breaker_delay:
+                    self._stopped.wait(breaker_delay)
+                    continue
+                items = self.queue.claim(self.job_id, self.worker_id)
+                if not items:
+                    if not self.queue.remaining(self.job_id):
+                        return
+                    # Everything left is leased by other workers or waiting for a retry
+                    self._stopped.wait(self.poll_interval)
+                    continue
+                for item in items:
+                    self._process(item)
+            except Exception as e:
+                # Unfinished leases simply expire and are picked up again
+                logger.error(f"Worker {self.worker_id} error: {e}", exc_info=True)
+                metrics.increment("worker_errors")
+                self._stopped.wait(self.poll_interval)
+
+    def run(self) -> Dict[int, int]:
+        """Work until the job has no pending or leased items left, return accepted counts by category id"""
+        logger.info(f"Worker {self.worker_id} joining job {self.job_id}")
+        heartbeat = threading.Thread(target=self._heartbeat, name="lease-heartbeat", daemon=True)
+        heartbeat.start()
+        try:
+            with ThreadPoolExecutor(max_workers=self.scheduler.max_workers, thread_name_prefix="worker") as executor:
+                for future in [executor.submit(self._loop) for _ in range(self.scheduler.max_workers)]:
+                    future.result()
+        finally:
+            self._stopped.set()
+        return {category_id: state.job.accepted for category_id, state in self.categories.items()}
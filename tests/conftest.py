@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The application modules live in src/ and import each other by plain name
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
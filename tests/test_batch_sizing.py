@@ -0,0 +1,19 @@
+from batch_sizing import BatchSizer
+
+
+def test_incomplete_responses_do_not_shrink_the_batch():
+    sizer = BatchSizer(initial_size=15, probe_every=100)
+    for _ in range(10):
+        # Backend failed after a third of the response
+        sizer.record("java", 15, 5, 1.0, prompt_tokens=1000, response_tokens=400, parsed=5, complete=False)
+
+    assert sizer.size("java") == 15
+    assert sizer.categories["java"].parse_rate is None
+
+
+def test_truncated_complete_responses_shrink_the_batch():
+    sizer = BatchSizer(initial_size=15, probe_every=100)
+    sizer.record("java", 15, 9, 1.0, prompt_tokens=1000, response_tokens=900, parsed=9)
+
+    assert sizer.size("java") == 12
+    assert sizer.categories["java"].reason.startswith("truncated")
@@ -0,0 +1,16 @@
+import sys
+from argparse import Namespace
+
+from bench_pipeline import run_benchmark
+
+
+def test_fake_backend_benchmark_stores_every_question(tmp_path):
+    args = Namespace(database_url=f"sqlite:///{tmp_path / 'bench.db'}", categories=2, questions=20, batch_size=5,
+                     max_workers=2, per_category=1, latency=0.0, jitter=0.0, error_rate=0.0, malformed_rate=0.0,
+                     seed=0)
+
+    result = run_benchmark(args)
+
+    assert result["accepted"] == 40
+    # The fake backend needs no LLM client library
+    assert "langchain" not in sys.modules
@@ -0,0 +1,24 @@
+import re
+
+from context_selection import ContextSelector, bounded_history
+
+
+def questions(count):
+    return [{"question": f"Question number {n} about generics?", "correct_answer": f"answer {n}"}
+            for n in range(count)]
+
+
+def test_digest_counts_the_whole_category_not_the_bounded_history():
+    history = bounded_history(questions(5000), recent=200, sample=300)
+    digest = ContextSelector(token_budget=500).build_digest(history, total_questions=5000)
+
+    shown = digest.count("\n- ") + 1
+    omitted = int(re.search(r"\(and (\d+) more", digest).group(1))
+    assert shown + omitted == 5000
+
+
+def test_digest_without_a_total_counts_the_list():
+    digest = ContextSelector(token_budget=500).build_digest(questions(100))
+
+    shown = digest.count("\n- ") + 1
+    assert shown + int(re.search(r"\(and (\d+) more", digest).group(1)) == 100
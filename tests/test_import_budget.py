@@ -0,0 +1,16 @@
+import pytest
+
+from bench_imports import MODULES, check_budget, measure_import
+
+BUDGET_MS = 100.0
+
+
+@pytest.mark.parametrize("module", MODULES)
+def test_import_is_fast_and_side_effect_free(module):
+    # Each module is imported in a fresh interpreter, without DATABASE_URL
+    result = measure_import(module)
+
+    assert "error" not in result, result.get("error")
+    assert result["heavy"] == []
+    assert result["stdout_lines"] == 0
+    assert check_budget([result], BUDGET_MS) == []
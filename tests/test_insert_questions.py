@@ -0,0 +1,25 @@
+from sqlalchemy import text
+
+from bench_pipeline import prepare_database
+
+
+def question(text_, answer):
+    return {"question": text_, "correct_answer": answer, "options": [answer, "other"]}
+
+
+def test_returned_ids_belong_to_their_rows(tmp_path):
+    db, categories = prepare_database(f"sqlite:///{tmp_path / 'quiz.db'}", 1)
+    batch = [question(f"Question {n}?", f"answer {n}") for n in range(5)]
+    batch.insert(2, {"question": "No answer?", "options": []})
+    batch.append(question("Question 1?", "answer 1"))
+
+    result = db.insert_questions(batch, categories[0]["id"])
+
+    assert [entry["index"] for entry in result["failed"]] == [2]
+    assert result["ids"][2] is None
+    with db.engine.connect() as connection:
+        stored = dict(connection.execute(text("SELECT id, question FROM quiz_questions")).fetchall())
+    for index, new_id in enumerate(result["ids"]):
+        if new_id is not None:
+            assert stored[new_id] == batch[index]["question"]
+    assert len(set(result["ids"]) - {None}) == 6
@@ -0,0 +1,51 @@
+from sqlalchemy import text
+
+from database import Database
+from schema import SQLITE_SCHEMA, create_leaderboard_schema
+
+
+def legacy_database(tmp_path):
+    # A database from before the leaderboard: no user_category_stats yet
+    db = Database(f"sqlite:///{tmp_path / 'scores.db'}")
+    with db.engine.begin() as connection:
+        for statement in SQLITE_SCHEMA:
+            connection.execute(text(statement))
+        connection.execute(text("INSERT INTO categories (name, name_ru, slug) VALUES ('Java', 'Джава', 'java')"))
+        connection.execute(text("INSERT INTO user_scores (user_id, category_id, score, correct_answers) "
+                                "VALUES (1, 1, 10, 3)"))
+    return db
+
+
+def stats(db):
+    entry = db.get_leaderboard(1)["entries"][0]
+    return entry["attempts"], entry["total_score"], entry["best_score"], entry["total_correct"]
+
+
+def score_rows(db):
+    with db.engine.connect() as connection:
+        return connection.execute(text("SELECT COUNT(*) FROM user_scores")).scalar()
+
+
+def test_score_saves_fail_until_the_leaderboard_is_migrated(tmp_path):
+    db = legacy_database(tmp_path)
+
+    assert not db.save_user_score(1, 1, 5, 2)
+    # The score row is rolled back with the failed aggregate update
+    assert score_rows(db) == 1
+
+    create_leaderboard_schema(db.engine)
+    assert stats(db) == (1, 10, 10, 3)
+
+    assert db.save_user_score(1, 1, 5, 2)
+    assert stats(db) == (2, 15, 10, 5)
+
+
+def test_rerunning_the_migration_reconciles_drifted_stats(tmp_path):
+    db = legacy_database(tmp_path)
+    create_leaderboard_schema(db.engine)
+    with db.engine.begin() as connection:
+        connection.execute(text("UPDATE user_category_stats SET attempts = 7, total_score = 0"))
+
+    create_leaderboard_schema(db.engine)
+
+    assert stats(db) == (1, 10, 10, 3)
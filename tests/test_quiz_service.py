@@ -0,0 +1,54 @@
+from quiz_service import QuizService
+
+
+class FakeDatabase:
+    """Serves a mutable list of questions; `during_load` runs in the middle of a load"""
+
+    def __init__(self):
+        self.write_listeners = []
+        self.questions = [self.question(1)]
+        self.loads = 0
+        self.during_load = None
+
+    @staticmethod
+    def question(question_id):
+        return {"id": question_id, "question": f"Question {question_id}?", "correct_answer": "a",
+                "options": ["a", "b", "c", "d"], "difficulty": "easy", "score": 5}
+
+    def iter_questions(self, category_id, columns=None):
+        self.loads += 1
+        snapshot = list(self.questions)
+        if self.during_load is not None:
+            during_load, self.during_load = self.during_load, None
+            during_load()
+        yield from snapshot
+
+    def insert(self, question_id):
+        self.questions.append(self.question(question_id))
+        for listener in self.write_listeners:
+            listener(1)
+
+
+def test_pool_is_cached_until_invalidated():
+    db = FakeDatabase()
+    service = QuizService(db)
+
+    assert len(service.draw(1, count=10)) == 1
+    assert len(service.draw(1, count=10)) == 1
+    assert db.loads == 1
+
+    db.insert(2)
+    assert len(service.draw(1, count=10)) == 2
+    assert db.loads == 2
+
+
+def test_insert_during_a_load_is_not_hidden_by_the_cache():
+    db = FakeDatabase()
+    service = QuizService(db)
+    db.during_load = lambda: db.insert(2)
+
+    # The load that raced with the insert still serves its snapshot once
+    assert len(service.draw(1, count=10)) == 1
+    # but it was not cached, so the next draw sees the new question
+    assert len(service.draw(1, count=10)) == 2
+    assert db.loads == 2
@@ -0,0 +1,75 @@
+import hashlib
+
+from bench_pipeline import prepare_database
+from refill_jobs import RefillJobStore, run_refill_job
+from retry import RetryPolicy
+from scheduler import GenerationScheduler
+
+
+def make_question(n):
+    words = " ".join(hashlib.sha1(f"refill:{n}:{i}".encode()).hexdigest()[:8] for i in range(6))
+    return {"question": f"What do {words} have in common?", "correct_answer": f"answer {n}",
+            "options": [f"answer {n}", f"wrong {n}a", f"wrong {n}b", f"wrong {n}c"],
+            "difficulty": "medium", "score": 5}
+
+
+class CountingGenerator:
+    calls = 0
+    next_question = 1000
+
+    def __init__(self, name, name_ru):
+        pass
+
+    def generate_questions(self, existing_questions, num_questions, total_questions=None):
+        CountingGenerator.calls += 1
+        start = CountingGenerator.next_question
+        CountingGenerator.next_question += num_questions
+        return [make_question(n) for n in range(start, start + num_questions)]
+
+
+def run_job(db, store, categories, target):
+    scheduler = GenerationScheduler(db, per_category=1, requests_per_second=0, batch_size=10,
+                                    generator_factory=CountingGenerator,
+                                    retry_policy=RetryPolicy(base_delay=0.01, jitter=False))
+    return run_refill_job(db, scheduler, store, "job", target, categories)
+
+
+def test_resume_replays_the_batch_in_flight_instead_of_calling_the_llm(tmp_path):
+    db, categories = prepare_database(f"sqlite:///{tmp_path / 'refill.db'}", 1)
+    category_id = categories[0]["id"]
+    store = RefillJobStore(str(tmp_path / "state.db"))
+    store.start("job", 10)
+    # The previous run got a response and crashed after storing part of it
+    in_flight = [make_question(n) for n in range(10)]
+    db.insert_questions(in_flight[:4], category_id)
+    store.checkpoint_batch("job", category_id, in_flight)
+    CountingGenerator.calls = 0
+
+    run_job(db, store, categories, 10)
+
+    assert CountingGenerator.calls == 0
+    assert db.count_questions_by_category()[category_id] == 10
+    assert store.pending_batches("job") == {}
+
+
+class FailingAfterOneBatch(CountingGenerator):
+    def generate_questions(self, existing_questions, num_questions, total_questions=None):
+        if CountingGenerator.calls:
+            raise RuntimeError("provider down")
+        return super().generate_questions(existing_questions, 5, total_questions)
+
+
+def test_stored_batches_are_cleared_even_if_the_job_is_incomplete(tmp_path):
+    db, categories = prepare_database(f"sqlite:///{tmp_path / 'refill.db'}", 1)
+    category_id = categories[0]["id"]
+    store = RefillJobStore(str(tmp_path / "state.db"))
+    scheduler = GenerationScheduler(db, per_category=1, requests_per_second=0, batch_size=10,
+                                    generator_factory=FailingAfterOneBatch,
+                                    retry_policy=RetryPolicy(base_delay=0.01, max_failures=1, jitter=False))
+    CountingGenerator.calls = 0
+
+    run_refill_job(db, scheduler, store, "job", 10, categories)
+
+    assert db.count_questions_by_category()[category_id] == 5
+    # The stored batch is not replayed when the job is resumed
+    assert store.pending_batches("job") == {}
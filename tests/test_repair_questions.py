@@ -0,0 +1,27 @@
+import pytest
+
+from repair_questions import repair_question
+
+OPTIONS = ["lazy", "eager", "parallel", "sorted"]
+
+
+def row(question):
+    return {"id": 1, "question": question, "correct_answer": "lazy", "options": list(OPTIONS)}
+
+
+@pytest.mark.parametrize("question", [
+    "Which is true about Java 8. Streams are lazy?",
+    "What does this loop do?\n1. init x\n2. loop until x > 10",
+])
+def test_clean_questions_are_left_alone(question):
+    assert repair_question(row(question)) is None
+
+
+@pytest.mark.parametrize("question", [
+    ": What are streams?",
+    "QUESTION: What are streams?",
+    "What are streams?\nANSWER: lazy",
+    "What are streams?\n1. lazy\n2. eager\nDIFFICULTY: easy",
+])
+def test_leaked_labels_are_removed(question):
+    assert repair_question(row(question))["question"] == "What are streams?"
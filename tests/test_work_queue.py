@@ -0,0 +1,214 @@
+import hashlib
+import threading
+import time
+
+import pytest
+
+from bench_pipeline import prepare_database
+from retry import CircuitBreaker, RetryPolicy
+from scheduler import GenerationScheduler
+from work_queue import DONE, FAILED, LEASED, PENDING, QueueWorker, WorkQueue
+
+
+class StaticGenerator:
+    """Returns distinct well-formed questions without calling an LLM"""
+
+    counter = 0
+    lock = threading.Lock()
+
+    def __init__(self, name, name_ru):
+        self.name = name
+
+    def generate_questions(self, existing_questions, num_questions, total_questions=None):
+        questions = []
+        with StaticGenerator.lock:
+            for _ in range(num_questions):
+                StaticGenerator.counter += 1
+                n = StaticGenerator.counter
+                words = " ".join(hashlib.sha1(f"{n}:{i}".encode()).hexdigest()[:8] for i in range(6))
+                questions.append({
+                    "question": f"What do {words} have in common?",
+                    "correct_answer": f"answer {n}",
+                    "options": [f"answer {n}", f"wrong {n}a", f"wrong {n}b", f"wrong {n}c"],
+                    "difficulty": "medium",
+                    "score": 5
+                })
+        return questions
+
+
+@pytest.fixture
+def database(tmp_path):
+    return prepare_database(f"sqlite:///{tmp_path / 'queue.db'}", 2)
+
+
+def make_scheduler(db, breaker=None):
+    return GenerationScheduler(db, max_workers=2, requests_per_second=0, generator_factory=StaticGenerator,
+                               retry_policy=RetryPolicy(base_delay=0.01, jitter=False),
+                               circuit_breaker=breaker)
+
+
+def item_row(db, job_id, category_id, batch_no):
+    from sqlalchemy import text
+
+    with db.engine.connect() as connection:
+        row = connection.execute(
+            text("SELECT status, num_questions, accepted, attempts, lease_owner FROM generation_work "
+                 "WHERE job_id = :job_id AND category_id = :category_id AND batch_no = :batch_no"),
+            {"job_id": job_id, "category_id": category_id, "batch_no": batch_no}
+        ).first()
+    return dict(zip(("status", "num_questions", "accepted", "attempts", "lease_owner"), row))
+
+
+def test_enqueue_splits_targets_and_is_idempotent(database):
+    db, categories = database
+    queue = WorkQueue(db)
+    targets = {categories[0]["id"]: 20, categories[1]["id"]: 15}
+
+    assert queue.enqueue("job", targets, batch_size=15) == 3
+    assert queue.enqueue("job", targets, batch_size=15) == 0
+    assert queue.status("job") == {PENDING: {"items": 3, "accepted": 0, "remaining": 35}}
+
+
+def test_enqueue_refuses_to_reuse_a_job_with_other_parameters(database):
+    db, categories = database
+    queue = WorkQueue(db)
+    targets = {categories[0]["id"]: 20}
+    queue.enqueue("job", targets, parameters={"target": 100})
+
+    # Workers joining with the same parameters share the job
+    assert queue.enqueue("job", {categories[0]["id"]: 5}, parameters={"target": 100}) == 0
+    with pytest.raises(ValueError, match="target"):
+        queue.enqueue("job", targets, parameters={"target": 120})
+    assert queue.enqueue("other", targets, parameters={"target": 120}) == 2
+
+
+def test_claims_are_exclusive_until_the_lease_expires(database):
+    db, categories = database
+    queue = WorkQueue(db, lease_seconds=0.2)
+    queue.enqueue("job", {categories[0]["id"]: 30}, batch_size=15)
+
+    first = queue.claim("job", "a", limit=10)
+    assert len(first) == 2
+    assert queue.claim("job", "b", limit=10) == []
+
+    time.sleep(0.3)
+    second = queue.claim("job", "b", limit=10)
+    assert sorted(item["batch_no"] for item in second) == [0, 1]
+    assert all(item["attempts"] == 2 for item in second)
+    # The expired lease now belongs to "b", so "a" can no longer finish it
+    assert not queue.finish(first[0], "a")
+    assert item_row(db, "job", categories[0]["id"], 0)["lease_owner"] == "b"
+
+
+def record_progress(db, queue, item, worker_id, accepted):
+    with db.engine.begin() as connection:
+        queue.record_progress(connection, item, worker_id, accepted)
+
+
+def test_finish_records_done_partial_and_failed_items(database):
+    db, categories = database
+    category_id = categories[0]["id"]
+    queue = WorkQueue(db)
+    queue.enqueue("job", {category_id: 45}, batch_size=15)
+    done, partial, failed = queue.claim("job", "w", limit=3)
+
+    record_progress(db, queue, done, "w", 15)
+    record_progress(db, queue, partial, "w", 5)
+    assert queue.finish(done, "w")
+    assert queue.finish(partial, "w", retry_after=60)
+    assert queue.finish(failed, "w", failed=True, error="boom")
+
+    assert item_row(db, "job", category_id, 0)["status"] == DONE
+    assert item_row(db, "job", category_id, 1) == {"status": PENDING, "num_questions": 10, "accepted": 5,
+                                                   "attempts": 1, "lease_owner": None}
+    assert item_row(db, "job", category_id, 2)["status"] == FAILED
+    # The partial item waits out its retry delay
+    assert queue.claim("job", "w") == []
+    assert queue.remaining("job") == 1
+
+
+def test_progress_is_committed_with_the_inserted_questions(database):
+    db, categories = database
+    category_id = categories[0]["id"]
+    queue = WorkQueue(db, lease_seconds=0.2)
+    queue.enqueue("job", {category_id: 10})
+    item = queue.claim("job", "dead")[0]
+    questions = StaticGenerator("Java", "Джава").generate_questions([], 4)
+
+    def progress(connection, stored):
+        queue.record_progress(connection, item, "dead", stored)
+
+    # The worker stores part of the item and dies before finish()
+    assert all(db.insert_questions(questions, category_id, on_insert=progress)["ids"])
+    time.sleep(0.3)
+    reclaimed = queue.claim("job", "next")[0]
+    assert reclaimed["num_questions"] == 6
+
+    # The dead worker's late insert is rolled back instead of overshooting
+    late = StaticGenerator("Java", "Джава").generate_questions([], 2)
+    assert db.insert_questions(late, category_id, on_insert=progress)["ids"] == [None, None]
+    assert db.count_questions_by_category()[category_id] == 4
+
+
+def test_release_does_not_count_an_attempt(database):
+    db, categories = database
+    category_id = categories[0]["id"]
+    queue = WorkQueue(db)
+    queue.enqueue("job", {category_id: 10})
+    item = queue.claim("job", "w")[0]
+
+    assert queue.release(item, "w")
+    assert item_row(db, "job", category_id, 0) == {"status": PENDING, "num_questions": 10, "accepted": 0,
+                                                   "attempts": 0, "lease_owner": None}
+    assert not queue.release(item, "w")
+
+
+def test_worker_completes_a_job(database):
+    db, categories = database
+    queue = WorkQueue(db)
+    queue.enqueue("job", {category["id"]: 20 for category in categories}, batch_size=15)
+    worker = QueueWorker(db, queue, make_scheduler(db), "job", poll_interval=0.05)
+
+    assert worker.run() == {category["id"]: 20 for category in categories}
+    assert queue.status("job") == {DONE: {"items": 4, "accepted": 40, "remaining": 0}}
+
+
+def test_run_batch_does_not_take_the_trial_while_the_category_backs_off(database):
+    db, categories = database
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    scheduler = make_scheduler(db, breaker)
+    breaker.record_failure()
+    time.sleep(0.1)
+    assert breaker.state == "half-open"
+
+    worker = QueueWorker(db, WorkQueue(db), scheduler, "job")
+    job = worker._category(categories[0]["id"]).job
+    job.not_before = time.monotonic() + 60
+
+    assert scheduler.run_batch(job, 5) is None
+    # The trial is still available to the next batch that really calls the LLM
+    assert breaker.allow() == 0
+
+
+def test_worker_recovers_from_a_half_open_breaker_with_delayed_items(database):
+    db, categories = database
+    category_id = categories[0]["id"]
+    queue = WorkQueue(db)
+    queue.enqueue("job", {category_id: 10})
+    # The only item is waiting out a retry delay, as after a provider outage
+    item = queue.claim("job", "previous")[0]
+    queue.finish(item, "previous", retry_after=0.5)
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    time.sleep(0.1)
+    worker = QueueWorker(db, queue, make_scheduler(db, breaker), "job", poll_interval=0.05)
+
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(worker.run()), daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+
+    assert not thread.is_alive(), "worker is stuck waiting for the circuit breaker"
+    assert result == {category_id: 10}
+    assert breaker.state == "closed"